@@ -0,0 +1,60 @@
+# Latency of handing files to an already running editor.
+# Run from the top level directory with
+#   python3 -m benchmarks.instance
+# A stand-in InstanceServer plays the running editor, so no display is needed.
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+from src.classes.instance import InstanceServer, send_paths, supported
+
+ROUND_TRIPS = 1000
+LAUNCHES = 10
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))]
+    return f"p50 {pick(0.5):8.3f} ms   p95 {pick(0.95):8.3f} ms   max {samples[-1]:8.3f} ms"
+
+def main():
+    if not supported():
+        print("No AF_UNIX sockets on this platform, nothing to measure")
+        return
+    directory = tempfile.mkdtemp()
+    os.makedirs(os.path.join(directory, "database"))
+    server = InstanceServer(os.path.join(directory, "database", "ac_editor.sock"))
+    assert server.start()
+
+    # In-process client, just the socket round trip
+    samples = []
+    for n in range(ROUND_TRIPS):
+        start = time.perf_counter()
+        assert send_paths([f"/notes/{n}.md"], server.socket_path)
+        samples.append((time.perf_counter() - start) * 1000)
+    received = sum(len(paths) for paths in server.pending())
+    print(f"{'send_paths round trip':<28} {percentiles(samples)}   ({received} received)")
+
+    # Whole second launch: interpreter start, argument parsing, hand off, exit
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    samples = []
+    for n in range(LAUNCHES):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.ac_editor", "notes.md"], cwd=directory, env=env, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    received = sum(len(paths) for paths in server.pending())
+    print(f"{'python3 -m src.ac_editor':<28} {percentiles(samples)}   ({received} received)")
+
+    # For comparison, just starting the interpreter
+    samples = []
+    for n in range(LAUNCHES):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{'python3 -c pass':<28} {percentiles(samples)}")
+    server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Benchmark for :notes, searching an FTS5 index of tens of thousands of notes.
+# Run from the top level directory with
+#   python3 -m benchmarks.notes
+import time
+import random
+
+from src.classes.file     import File
+from src.classes.database import Database
+
+NOTES = 30_000
+WORDS_PER_NOTE = 300
+QUERIES = ["meeting", "tkinter widget", "sqlite ind", "zebra"]
+
+def make_vocabulary():
+    random.seed(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(random.choice(letters) for _ in range(random.randint(3, 9))) for _ in range(20_000)]
+    return words + ["meeting", "tkinter", "widget", "sqlite", "index"]
+
+def main():
+    words = make_vocabulary()
+    database = Database(":memory:")
+    start = time.perf_counter()
+    for n in range(NOTES):
+        content = " ".join(random.choice(words) for _ in range(WORDS_PER_NOTE))
+        database.index_note(File(f"/notes/{n}.md", f"{n}.md", n, None, False), content)
+    print(f"indexed {NOTES} notes in {time.perf_counter() - start:.1f} s")
+
+    file = File("/notes/0.md", "0.md", 0, None, False)
+    start = time.perf_counter()
+    database.index_note(file, database.note_content("file:/notes/0.md"))
+    print(f"{'unchanged re-index':<24} {(time.perf_counter() - start) * 1000:10.2f} ms")
+
+    for query in QUERIES:
+        start = time.perf_counter()
+        results = database.search_notes(query)
+        print(f"{query!r:<24} {(time.perf_counter() - start) * 1000:10.2f} ms  {len(results)} results")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Benchmark for the :s engine, replacing 100k matches in a large file.
+# Run from the top level directory with
+#   python3 -m benchmarks.substitute
+# Applying the edits to a CodeView needs a display, that part is skipped without one.
+# The CodeView uses a real lexer, since re-highlighting is most of the cost of applying.
+import time
+import tkinter as tk
+
+from pygments.lexers import PythonLexer
+
+from src.classes.batch_edit import BatchEdit
+from src.classes.substitute import parse_substitute, compute_substitution
+
+LINES = 200_000
+MATCHES = 100_000
+
+def make_text():
+    lines = []
+    for n in range(LINES):
+        if n % (LINES // MATCHES) == 0:
+            lines.append(f"line {n} has a foo in it")
+        else:
+            lines.append(f"line {n} has nothing in it")
+    return "\n".join(lines)
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print(f"{label:<24} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+def apply(codeview, edits):
+    with BatchEdit(codeview) as batch:
+        for (start_line, start_col), (end_line, end_col), text in edits:
+            batch.replace(f"{start_line}.{start_col}", f"{end_line}.{end_col}", text)
+
+def main():
+    text = make_text()
+    print(f"{LINES} lines, {len(text)} chars")
+    substitution = timed("parse", parse_substitute, ":%s/foo/bar/g")
+    result = timed("compute", compute_substitution, text, 1, substitution)
+    print(f"{result.count} substitutions on {result.lines} lines, {len(result.edits)} edit(s)")
+    assert result.count == MATCHES
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print("No display, skipping CodeView application")
+        return
+    from src.classes.editor_view import EditorView
+    codeview = EditorView(root, lexer=PythonLexer, undo=True)
+    timed("insert + highlight all", codeview.insert, "1.0", text)
+    timed("apply to CodeView", apply, codeview, result.edits)
+    assert codeview.get("1.0", "end-1c") == text.replace("foo", "bar")
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,66 @@
 import os
 import re
-import tkinter as tk
+import sys
+
+from argparse import ArgumentParser
+
+from .classes.instance import InstanceServer, send_paths
+
+def parse_arguments(argv):
+    parser = ArgumentParser(prog="ac_editor")
+    parser.add_argument("paths", nargs="*", help="files to open, - reads stdin into a new tab")
+    parser.add_argument("--tail", type=int, metavar="LINES", help="only keep the last LINES lines of stdin")
+    parser.add_argument("--trace-startup", action="store_true", help="time each startup phase, see README")
+    parser.add_argument("--trace-startup-time", action="store_true",
+                        help="like --trace-startup without tracking allocations, which slows startup down")
+    return parser.parse_args(argv)
+
+####################################################
+# Single instance
+# If an editor is already running, give it our files
+# and exit before paying for Tk, pygments or SQLite
+####################################################
+instance = InstanceServer()
+arguments = parse_arguments(sys.argv[1:] if __name__ == "__main__" else [])
+if __name__ == "__main__":
+    paths = [os.path.abspath(p) for p in arguments.paths if p != "-"]
+    stdin = sys.stdin.buffer if "-" in arguments.paths else None
+    hand_off = lambda: send_paths(paths, stream=stdin, tail=arguments.tail)
+    if hand_off():
+        sys.exit(0)
+
+from typing             import List, Dict
+from concurrent.futures import ThreadPoolExecutor, BrokenExecutor
+
+from .classes.startup_trace import StartupTrace
 
-from tkinter         import ttk, PhotoImage, filedialog
-from typing          import List
-from chlorophyll     import CodeView
-from pygments.util   import ClassNotFound
-from pygments.lexers import TextLexer, get_lexer_for_filename
+# Created before the heavy imports below so that --trace-startup can time them
+trace = StartupTrace.from_environment(arguments.trace_startup, arguments.trace_startup_time)
 
-from .classes.file           import File
+with trace.phase("import tkinter"):
+    import tkinter as tk
+    from tkinter import ttk, PhotoImage, filedialog
+
+with trace.phase("import chlorophyll + pygments"):
+    from pygments.util   import ClassNotFound
+    from pygments.lexers import TextLexer, get_lexer_for_filename
+    from .classes.editor_view import EditorView
+
+from .classes.file           import File, document_key
 from .classes.database       import Database
 from .classes.settings       import Settings
 from .classes.vim_controller import VimController
+from .classes.batch_edit     import BatchEdit
+from .classes.substitute     import is_substitute, parse_substitute, compute_substitution
+from .classes.macro          import MacroRecorder, MAX_DEPTH, parse_macro
+from .classes.note           import note_key
+from .classes.word_index     import WordIndex, Completion, merge_candidates
+from .classes.stream         import StreamBuffer
+from .classes.structure_index import StructureIndex, uses_headings
+from .classes.history        import line_edits
+from .classes.document_stats import DocumentStats, total_stats
+from .classes.registers      import Registers, UNNAMED, command_register, indent_lines, dedent_columns
+from .classes.highlight      import make_pool, pool_size, warm_up, BLOCK_LINES, lexer_spec, uses_tokens, tokenize_blocks, HighlightJob
 
 ############
 # Constants
@@ -44,6 +93,17 @@ VIM_CHARS = [
     "<Shift-G>",
     "<Shift-asciicircum>", 
     "<Shift-dollar>",
+    "<at>",
+    "<z>",
+    "<v>",
+    "<V>",
+    "<d>",
+    "<y>",
+    "<p>",
+    "<less>",
+    "<greater>",
+    "<asciitilde>",
+    "<quotedbl>",
     "0", 
     "1", 
     "2", 
@@ -56,6 +116,16 @@ VIM_CHARS = [
     "9"
 ]
 
+# The characters produced by the keys above, used to route replayed macro keys
+VIM_CHAR_VALUES = "ihjklgwqzvVdyp<>~\":!AG^$@0123456789"
+
+# Keys with a binding of their own, by keysym
+SPECIAL_KEY_EVENTS = {
+    "Escape"    : "esc",
+    "Return"    : "ret",
+    "BackSpace" : "back"
+}
+
 VIM_REGEX = {
     "([1-9]+[0-9]*)*h" : lambda: h(),
     "([1-9]+[0-9]*)*j" : lambda: j(),
@@ -66,22 +136,58 @@ VIM_REGEX = {
     "\\^" : lambda: hat(),
     "\\$" : lambda: dollar(), 
     "gg"  : lambda: gg(),
-    "G"   : lambda: G()
+    "G"   : lambda: G(),
+    "q[a-z]" : lambda: record_macro(),
+    "([1-9]+[0-9]*)*@([a-z]|@)" : lambda: replay_macro(),
+    "za"  : lambda: za(),
+    "zc"  : lambda: zc(),
+    "zo"  : lambda: zo(),
+    "zM"  : lambda: zM(),
+    "zR"  : lambda: zR(),
+    "v"   : lambda: v(),
+    "V"   : lambda: V(),
+    "(\"[a-z])?d" : lambda: d(),
+    "(\"[a-z])?y" : lambda: y(),
+    "(\"[a-z])?p" : lambda: p(),
+    ">"   : lambda: greater(),
+    "<"   : lambda: less(),
+    "~"   : lambda: tilde()
 }
 
+# Commands that are still waiting for their last key (qa, 5@a, za, "ay, ...)
+PENDING_PREFIX_REGEX = "q|([1-9]+[0-9]*)*@|z|\""
+
+# What > and < add and remove
+INDENT = "    "
+
+# Every closed fold is its own elided tag, fold1, fold2, ... so nested folds
+# can be opened and closed independently
+FOLD_TAG = "fold"
+
+NOTES_REGEX = ":notes (.+)"
+HISTORY_REGEX = ":history"
+STATS_REGEX = ":stats"
+
 # Pretty brutal, but basically every non-special vim key is being assigned to a function
 # that will check which mode the program is in to determine if the keypress is valid
 NON_VIM_CHARS = [
-    '<a>', '<b>', '<c>', '<d>', '<e>', '<f>', '<g>', '<m>', 
-    '<p>', '<r>', '<t>', '<u>', '<v>', '<w>', '<x>', '<y>', '<z>',
+    '<a>', '<b>', '<c>', '<e>', '<f>', '<g>', '<m>', 
+    '<r>', '<t>', '<u>', '<w>', '<x>',
     '<B>', '<C>', '<D>', '<E>', '<F>', '<H>', '<I>', '<J>', '<K>', '<L>', '<M>', '<N>', 
-    '<O>', '<P>', '<Q>', '<R>', '<S>', '<T>', '<U>', '<V>', '<W>', '<X>', '<Y>', '<Z>',
-    '<less>', '<comma>', '<greater>', '<period>', '<question>', '<slash>', '<semicolon>', '<quotedbl>', 
+    '<O>', '<P>', '<Q>', '<R>', '<S>', '<T>', '<U>', '<W>', '<X>', '<Y>', '<Z>',
+    '<comma>', '<period>', '<question>', '<slash>', '<semicolon>', 
     '<apostrophe>', '<braceleft>', '<bracketleft>', '<bracketright>', '<braceright>', '<equal>', '<plus>', 
     '<minus>', '<underscore>', '<parenleft>', '<parenright>', '<asterisk>', '<ampersand>', '<percent>', 
-    '<numbersign>', '<at>', '<asciitilde>', '<grave>'
+    '<numbersign>', '<grave>'
 ]
 
+# How often (ms) the Tk thread checks whether background work has finished
+POLL_MS = 10
+# How often (ms) the Tk thread checks for files sent by other launches
+INSTANCE_POLL_MS = 100
+# How often (ms) text streamed from a pipe is added to its tab
+STREAM_POLL_MS = 50
+
 ###################################################
 # Global GUI State
 # Despite general bad practice, seemed 
@@ -90,21 +196,56 @@ NON_VIM_CHARS = [
 # with a different GUI API would have been better
 # but I'm in too deep for that now. 
 ###################################################
-window = tk.Tk()
+# Forked before Tk exists, see classes/highlight.py
+with trace.phase("start tokenizer pool"):
+    tokenizer = make_pool()
+    if __name__ == "__main__":
+        tokenizer.submit(warm_up)
+# The first submit forks the workers, so only now is the instance server's socket
+# opened and its thread started, neither should end up in the workers. start()
+# fails if another editor beat us to the socket, so try handing off once more.
+if __name__ == "__main__" and not instance.start() and hand_off():
+    sys.exit(0)
+with trace.phase("tk.Tk()"):
+    window = tk.Tk()
 settings = Settings()
-database = Database()
+with trace.phase("Database()"):
+    database = Database()
 vim_label = ttk.Label(window, anchor="w")
 vim_controller = VimController(ttk.Label(window, anchor="w"))
+macros = MacroRecorder()
+registers = Registers()
 files : List[File] = []
-codeviews : List[CodeView] = []
+codeviews : List[EditorView] = []
+# The tab of every saved file, by document_key
+documents : Dict[str, EditorView] = {}
+# Built the first time completion is used in a tab, then kept up to date from edits
+word_indexes : List[WordIndex] = []
+# Same for folding
+structure_indexes : List[StructureIndex] = []
+# And for the counts in the status line, built the first time a tab is shown
+document_stats_list : List[DocumentStats] = []
+status_scheduled = False
+fold_count = 0
+completion = None
 notebook = ttk.Notebook(window)
+# Single worker so that background commands on a buffer finish in the order issued
+worker = ThreadPoolExecutor(max_workers=1)
+# Tabs whose tokens are back from the pool, waiting to be tagged
+highlight_jobs : List[HighlightJob] = []
+highlight_scheduled = False
 
 ###################
 # Closing function
 ###################
 def end():
-    global window, database, files, settings
+    global window, database, files, settings, instance, tokenizer
+    instance.close()
+    tokenizer.shutdown(wait=False, cancel_futures=True)
     update_files()
+    for f in files:
+        if f.is_unsaved:
+            database.index_note(f, f.content)
     database.close([f for f in files], settings)
     window.quit()
     window.destroy()
@@ -114,12 +255,28 @@ def end():
 # Codeview helpers
 ###################
 def bind_codeview(codeview):
+    # Every keypress passes through the recorder before the bindings below
+    codeview.bindtags(("MacroRecorder",) + codeview.bindtags())
+
     for char in NON_VIM_CHARS: 
-        codeview.bind(char, lambda event: normal_key())
+        codeview.bind(char, lambda event: normal_key(event))
+
+    # Catches printable keys without a binding of their own (s, n, o, space, ...)
+    # so they can be typed into the command line
+    codeview.bind("<Key>", lambda event: normal_key(event))
 
     for char in VIM_CHARS: 
         codeview.bind(char, WINDOW_EVENTS["vim"])
 
+    # In INSERT mode these complete words, otherwise ctrl + n still makes a new file
+    codeview.bind("<Control-n>", lambda event: complete(1))
+    codeview.bind("<Control-p>", lambda event: complete(-1))
+
+    # Anything that can move the cursor or change the text updates the status line
+    codeview.bind("<KeyRelease>", lambda event: schedule_status())
+    codeview.bind("<ButtonRelease-1>", lambda event: schedule_status())
+    codeview.bind("<<ContentChanged>>", lambda event: schedule_status(), add="+")
+
     codeview.bind("<Escape>", WINDOW_EVENTS["esc"])
     codeview.bind("<Return>", WINDOW_EVENTS["ret"])
     codeview.bind("<BackSpace>", WINDOW_EVENTS["back"])
@@ -128,10 +285,11 @@ def bind_codeview(codeview):
 def make_codeview(file):
     global notebook, settings
     frame = ttk.Frame(notebook)
-    codeview = CodeView(frame,
-                        color_scheme=settings.colour,
-                        font=(settings.font_type, settings.font_size),
-                        lexer=determine_lexer(file))
+    codeview = EditorView(frame,
+                          color_scheme=settings.colour,
+                          font=(settings.font_type, settings.font_size),
+                          lexer=determine_lexer(file),
+                          undo=True)
     # Jank has to be set after constructor for some reason...
     codeview.config(insertwidth=7)
     codeview.pack(fill="both", expand=True)
@@ -141,7 +299,10 @@ def make_codeview(file):
 def fill_codeview(codeview, file):
     failed = False
     content = file.content
-    if file.is_unsaved == False:
+    # A path that doesn't exist yet starts out empty, :w creates it
+    if file.is_unsaved == False and not os.path.lexists(file.path):
+        content = ""
+    elif file.is_unsaved == False:
         try:
             with open(file.path) as f:
                 content = f.read()
@@ -149,7 +310,12 @@ def fill_codeview(codeview, file):
             tk.messagebox.showerror("Error", "Invalid file type.")
             failed = True
     if not failed:
-        codeview.insert(tk.END, content)
+        # Plain text for now, highlight() tags it once the pool has lexed it
+        codeview.raw("insert", "end", content)
+        codeview.event_generate("<<ContentChanged>>")
+        highlight(codeview)
+    # Loading the file shouldn't be something you can undo
+    codeview.edit_reset()
 
 ###########################
 # General helper functions
@@ -198,6 +364,27 @@ def codeview_contents(codeview):
 def make_icon(path):
     return PhotoImage(file=path)
 
+def codeview_line(codeview, index):
+    return int(codeview.index(index).split(".")[0])
+
+def last_line(codeview):
+    return codeview_line(codeview, "end-1c")
+
+# Runs fn(*args) on the worker thread, then calls done(result) on the Tk thread
+def run_in_background(done, fn, *args):
+    global worker
+    when_done(worker.submit(fn, *args), done)
+
+# Calls done(future) on the Tk thread once future has finished
+def when_done(future, done):
+    global window
+    def poll():
+        if future.done():
+            done(future)
+        else:
+            window.after(POLL_MS, poll)
+    window.after(POLL_MS, poll)
+
 ####################
 # Aesthetic helpers
 ####################
@@ -210,6 +397,34 @@ def update_display(index):
     update_title()
     vim_controller.update_display(index)
     codeviews[index].focus_set()
+    schedule_status()
+
+# Coalesces everything that happened since the last refresh into one
+def schedule_status():
+    global window, status_scheduled
+    if not status_scheduled:
+        status_scheduled = True
+        window.after_idle(refresh_status)
+
+def refresh_status():
+    global vim_controller, codeviews, status_scheduled
+    status_scheduled = False
+    index = current_index()
+    line, col = codeviews[index].index("insert").split(".")
+    vim_controller.set_stats(index, f"{line}:{int(col) + 1}    |    {document_stats(index).describe()}")
+    vim_controller.update_display(index)
+
+# Scrolling is skipped while a macro replays, the view catches up when it ends
+def see_insert(codeview):
+    global macros
+    if not macros.replaying():
+        codeview.see("insert")
+
+def show_message(index, message):
+    global vim_controller
+    vim_controller.set_message(index, message)
+    if index == current_index():
+        vim_controller.update_display(index)
 
 def update_title():
     global files, window
@@ -222,12 +437,19 @@ def update_title():
 # File handling functions
 ##########################
 def add_file(file):
-    global files, codeviews, notebook, vim_controller
-    codeview, frame = make_codeview(file)
-    fill_codeview(codeview, file)
+    global files, codeviews, notebook, vim_controller, trace
+    with trace.phase("make_codeview"):
+        codeview, frame = make_codeview(file)
+    with trace.phase("fill_codeview"):
+        fill_codeview(codeview, file)
     bind_codeview(codeview)
     files.append(file)
     codeviews.append(codeview)
+    if not file.is_unsaved:
+        documents[document_key(file.path)] = codeview
+    word_indexes.append(None)
+    structure_indexes.append(None)
+    document_stats_list.append(None)
     notebook.add(frame, text=file.name)
     vim_controller.new_buffer()
     vim_controller.update_display(current_index())
@@ -242,50 +464,99 @@ def new():
     show_last()
 
 def load():
-    global notebook
     path = filedialog.askopenfilename()
     if path != "":
-        name = os.path.basename(path)
-        file = File(path=path,
-                    name=name,
-                    rank=determine_rank(),
-                    content=None,
-                    is_unsaved=False)        
-        add_file(file)
-        show_last()
+        open_path(path)
     # This is kind of bad
     # if this is called we ignore the keypress 
     # I think something a bit more low level than tkinter would 
     # have been better in hindsight
     return "break"
 
+# The tab index path is open in, or None
+def document_index(path):
+    global codeviews, documents
+    codeview = documents.get(document_key(path))
+    return codeviews.index(codeview) if codeview != None else None
+
+def forget_document(index):
+    global files, codeviews, documents
+    file = files[index]
+    if not file.is_unsaved and documents.get(document_key(file.path)) == codeviews[index]:
+        del documents[document_key(file.path)]
+
+def open_path(path):
+    global files, notebook, database
+    # Already open, just switch to it
+    index = document_index(path)
+    if index != None:
+        notebook.select(index)
+        return
+    name = os.path.basename(path)
+    file = File(path=path,
+                name=name,
+                rank=determine_rank(),
+                content=None,
+                is_unsaved=False)        
+    add_file(file)
+    show_last()
+    # A new file is indexed by save() once it exists, :notes can't open it before that
+    if not os.path.lexists(path):
+        show_message(len(files) - 1, f"\"{name}\" [New]")
+        return
+    database.index_note(file, codeview_contents(codeviews[-1]))
+
+# Paths from the command line or a later launch. Directories can't be edited,
+# anything else gets a tab, even if it doesn't exist yet.
+def open_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            show_message(current_index(), f"\"{os.path.basename(os.path.normpath(path))}\" is a directory")
+        else:
+            open_path(path)
+
 def save():
-    global files, codeviews
+    global files, codeviews, database
     index = current_index()
     file = files[index]
     if file.is_unsaved:
         save_as()
     else:
+        content = codeview_contents(codeviews[index])
         with open(file.path, "w") as f:
-            f.write(codeview_contents(codeviews[index]))
+            f.write(content)
+        database.record_version(file.path, content)
+        database.index_note(file, content)
 
 def save_as():
-    global files, codeviews, notebook
+    global files, codeviews, documents, notebook, database
     path = filedialog.asksaveasfilename()
     if path == "":
         return
     index = current_index()
+    # Two tabs saving to one file would keep overwriting each other
+    other = document_index(path)
+    if other != None and other != index:
+        show_message(index, f"E139: {os.path.basename(path)} is open in another tab")
+        return
     old_file = files[index]
     new_file = File(path=path,
                     name=os.path.basename(path),
                     rank=old_file.rank,
                     content="",
                     is_unsaved=False)
+    forget_document(index)
     files[index] = new_file
+    documents[document_key(path)] = codeviews[index]
     notebook.tab(index, text=new_file.name)
 
+    content = codeview_contents(codeviews[index])
     with open(path, "w") as f:
-        f.write(codeview_contents(codeviews[index]))
+        f.write(content)
+    database.record_version(path, content)
+    if old_file.is_unsaved:
+        database.remove_note(note_key(old_file))
+    database.index_note(new_file, content)
     update_title()
 
 def close():
@@ -305,8 +576,17 @@ def close():
         remove_file(index)
 
 def remove_file(index):
-    global files, codeviews, notebook, vim_controller
+    global files, codeviews, documents, notebook, vim_controller
+    archive_note(index)
+    forget_document(index)
+    # Jobs waiting for a fold to open would otherwise wait forever
+    for job in [j for j in highlight_jobs if j.codeview == codeviews[index]]:
+        highlight_jobs.remove(job)
+        job.finish()
     del codeviews[index]
+    del word_indexes[index]
+    del structure_indexes[index]
+    del document_stats_list[index]
     del files[index]
     del vim_controller.buffers[index]
     notebook.forget(index)
@@ -323,12 +603,18 @@ def is_valid_vim(command):
     return (False, None)
 
 def process_vim(command):
-    global vim_controller
+    global vim_controller, macros
+    if command == "q" and macros.recording != None:
+        stop_recording()
+        vim_controller.reset_buffers(current_index())
+        return "break"
     values = is_valid_vim(command)
     valid = values[0]
     regex = values[1] 
     if valid:
         VIM_REGEX[regex]()
+        if vim_controller.in_visual(current_index()):
+            show_selection(current_index())
         vim_controller.reset_buffers(current_index()) 
     # Returning "break" prevents default behaviour
     return "break" if valid else None
@@ -351,14 +637,26 @@ def vim(event=None):
 #############################################################
 # Key handling functions (keys that are not vim-significant)
 #############################################################
-def normal_key():
+def normal_key(event):
     global vim_controller
-    normal = vim_controller.in_normal(current_index())
-    return "break" if normal else None
+    index = current_index()
+    # VISUAL takes the same keys as NORMAL
+    normal = not vim_controller.in_insert(index)
+    printable = event.char != "" and event.char.isprintable()
+    if normal and printable and vim_controller.in_command(index):
+        vim_controller.append_buffer(event.char, index)
+        vim_controller.update_display(index)
+    elif normal and printable and re.fullmatch(PENDING_PREFIX_REGEX, vim_controller.current_command(index)):
+        vim_controller.append_buffer(event.char, index)
+        vim_controller.update_display(index)
+        process_vim(vim_controller.current_command(index))
+    return "break" if (normal and printable) else None
 
 def esc():
     global vim_controller
     index = current_index()
+    if vim_controller.in_visual(index):
+        exit_visual(index)
     vim_controller.switch_normal(index)
 
 def ret():
@@ -378,8 +676,29 @@ def ret():
                 vim_controller.reset_buffers(index)
             return "break"
 
+    notes_match = re.fullmatch(NOTES_REGEX, command)
+    if notes_match:
+        vim_controller.reset_buffers(index)
+        notes(notes_match.group(1))
+        return "break"
+
+    if re.fullmatch(STATS_REGEX, command):
+        vim_controller.reset_buffers(index)
+        stats()
+        return "break"
+
+    if re.fullmatch(HISTORY_REGEX, command):
+        vim_controller.reset_buffers(index)
+        history()
+        return "break"
+
+    if is_substitute(command):
+        substitute(command)
+        vim_controller.reset_buffers(index)
+        return "break"
+
     result = process_vim(vim_controller.current_command(index))
-    if vim_controller.in_normal(index):
+    if not vim_controller.in_insert(index):
         return "break"
     else:
         return result
@@ -388,7 +707,7 @@ def ret():
 def back(event=None):
     global vim_controller
     index = current_index()
-    if vim_controller.in_normal(index):
+    if not vim_controller.in_insert(index):
         vim_controller.delete_char(index)
         return "break"
     return None
@@ -420,30 +739,32 @@ def parse_buffer():
 def h():
     codeview = current_codeview()
     amount = parse_buffer()
-    codeview.mark_set("insert", f"insert-{amount} c")
-    codeview.see("insert")
+    codeview.mark_set("insert", f"insert -{amount} display chars")
+    see_insert(codeview)
 
 def j():
     codeview = current_codeview()
     amount = parse_buffer()
-    codeview.mark_set("insert", f"insert +{amount} l")
-    codeview.see("insert")
+    codeview.mark_set("insert", f"insert +{amount} display lines")
+    see_insert(codeview)
 
 def k():
     codeview = current_codeview()
     amount = parse_buffer()
-    codeview.mark_set("insert", f"insert -{amount} l")
-    codeview.see("insert")
+    codeview.mark_set("insert", f"insert -{amount} display lines")
+    see_insert(codeview)
 
 def l():
     codeview = current_codeview()
     amount = parse_buffer()
-    codeview.mark_set("insert", f"insert+{amount} c")
-    codeview.see("insert")
+    codeview.mark_set("insert", f"insert +{amount} display chars")
+    see_insert(codeview)
 
 def i():
     global vim_controller
     index = current_index()
+    if vim_controller.in_visual(index):
+        exit_visual(index)
     vim_controller.switch_insert(index)
 
 def A():
@@ -453,23 +774,27 @@ def A():
 def hat():
     codeview = current_codeview()
     codeview.mark_set("insert", "insert linestart")
-    codeview.see("insert")
+    see_insert(codeview)
 
 def dollar():
     codeview = current_codeview()
     codeview.mark_set("insert", "insert lineend")
-    codeview.see("insert")
+    see_insert(codeview)
 
 def gg():
     codeview = current_codeview()
     codeview.mark_set("insert", "1.0")
-    codeview.see("insert")
+    see_insert(codeview)
 
 def G():
     codeview = current_codeview()
-    codeview.mark_set("insert", "end")
-    hat()
-    codeview.see("insert")
+    line = last_line(codeview)
+    # The last line may be inside a closed fold, the cursor goes to its header then
+    for first, last in folded_lines(codeview):
+        if first <= line <= last:
+            line = min(line, first - 1)
+    codeview.mark_set("insert", f"{line}.0")
+    see_insert(codeview)
 
 def w():
     save()
@@ -487,46 +812,840 @@ def wq():
     files[current_index()].has_changed = False
     close()
 
+########################
+# Substitution (:s, :%s)
+########################
+def substitute(command):
+    index = current_index()
+    codeview = codeviews[index]
+    try:
+        substitution = parse_substitute(command)
+    except ValueError as e:
+        show_message(index, str(e))
+        return
+    first, last = substitution.resolve_range(codeview_line(codeview, "insert"), last_line(codeview))
+    snapshot = codeview.get(f"{first}.0", f"{last}.end")
+    # Keys replayed after this one expect the text to be replaced already, so
+    # no background work, and the edits join the replay's batch
+    if macros.replaying():
+        try:
+            result = compute_substitution(snapshot, first, substitution)
+        except Exception as e:
+            show_message(index, f"Substitution failed: {e}")
+            return
+        apply_substitution(index, codeview, result)
+        return
+    # Any edit made while the substitution is being computed sets the modified flag,
+    # which tells us the snapshot is stale and the result can't be applied
+    codeview.edit_modified(False)
+    done = lambda future: finish_substitute(codeview, future)
+    run_in_background(done, compute_substitution, snapshot, first, substitution)
+
+def finish_substitute(codeview, future):
+    global codeviews, files
+    if codeview not in codeviews:
+        return
+    index = codeviews.index(codeview)
+    try:
+        result = future.result()
+    except Exception as e:
+        show_message(index, f"Substitution failed: {e}")
+        return
+    if codeview.edit_modified():
+        show_message(index, "Buffer changed during substitution, nothing replaced")
+        return
+    apply_substitution(index, codeview, result)
+
+def apply_substitution(index, codeview, result):
+    global files
+    if result.count == 0:
+        show_message(index, "Pattern not found")
+        return
+    if result.edits:
+        apply_edits(codeview, result.edits)
+        codeview.mark_set("insert", f"{result.last_line}.0")
+        see_insert(codeview)
+        files[index].has_changed = True
+    show_message(index, f"{result.count} substitutions on {result.lines} lines")
+
+# Edits are ((line, col), (line, col), text), ordered bottom to top
+def apply_edits(codeview, edits):
+    with BatchEdit(codeview) as batch:
+        for (start_line, start_col), (end_line, end_col), text in edits:
+            batch.replace(f"{start_line}.{start_col}", f"{end_line}.{end_col}", text)
+
+###################
+# Macros (q and @)
+###################
+def record_key(event):
+    global macros
+    # Shortcuts like ctrl + s aren't part of a macro
+    if event.state & 0x4 == 0:
+        macros.record(event.char, event.keysym)
+
+def record_macro():
+    global vim_controller, macros
+    register = vim_controller.current_command(current_index())[1]
+    macros.start(register)
+    vim_controller.set_recording(register)
+
+def stop_recording():
+    global vim_controller, macros
+    macros.stop()
+    vim_controller.set_recording(None)
+
+def replay_macro():
+    global vim_controller, macros, codeviews
+    index = current_index()
+    count, register = parse_macro(vim_controller.current_command(index))
+    keys = macros.get(register)
+    if keys == None:
+        show_message(index, f"Nothing recorded in register {register}")
+        return
+    if macros.depth >= MAX_DEPTH:
+        return
+    vim_controller.reset_buffers(index)
+    codeview = codeviews[index]
+    if macros.replaying():
+        play_keys(codeview, keys * count)
+        return
+    # Top level replay: status line, scrolling and highlighting wait until the end,
+    # and everything typed is applied as one undo step
+    vim_controller.suspend_display()
+    try:
+        with BatchEdit(codeview) as batch:
+            macros.batch = batch
+            play_keys(codeview, keys * count)
+    finally:
+        macros.batch = None
+        vim_controller.resume_display(current_index())
+    see_insert(current_codeview())
+
+# Feeds keys to the same handlers the Tk bindings use. Text typed in INSERT mode
+# is collected and inserted in one go instead of character by character.
+def play_keys(codeview, keys):
+    global vim_controller, macros, files, codeviews
+    macros.depth += 1
+    index = codeviews.index(codeview)
+    typed = []
+    try:
+        for key in keys:
+            if vim_controller.in_insert(index):
+                if key.is_typed():
+                    typed.append(key.typed_text())
+                    continue
+                if key.keysym == "BackSpace" and typed:
+                    typed.pop()
+                    continue
+            flush_typed(index, typed)
+            insert = vim_controller.in_insert(index)
+            result = dispatch_key(key)
+            if insert and key.keysym == "BackSpace" and result != "break":
+                macros.batch.delete("insert-1c", "insert")
+            # :q and friends can close the tab being replayed into
+            if key.keysym == "Return" and codeview not in codeviews:
+                break
+        if codeview in codeviews:
+            flush_typed(codeviews.index(codeview), typed)
+    finally:
+        macros.depth -= 1
+
+def flush_typed(index, typed):
+    global macros, files
+    if typed:
+        macros.batch.insert("insert", "".join(typed))
+        files[index].has_changed = True
+        typed.clear()
+
+def dispatch_key(key):
+    if key.keysym in SPECIAL_KEY_EVENTS:
+        return WINDOW_EVENTS[SPECIAL_KEY_EVENTS[key.keysym]](key)
+    if key.char in VIM_CHAR_VALUES:
+        return vim(key)
+    return normal_key(key)
+
+#################
+# Notes (:notes)
+#################
+# A closed unsaved buffer stays searchable, it just isn't tied to its tab name anymore
+def archive_note(index):
+    global files, codeviews, database
+    file = files[index]
+    if not file.is_unsaved:
+        return
+    content = codeview_contents(codeviews[index])
+    if content == "":
+        database.remove_note(note_key(file))
+    else:
+        database.index_note(file, content)
+        database.archive_note(file)
+
+def notes(query):
+    global database
+    index = current_index()
+    if not database.has_notes:
+        show_message(index, "Notes search needs SQLite with FTS5")
+        return
+    results = database.search_notes(query)
+    if len(results) == 0:
+        show_message(index, f"No notes match {query}")
+        return
+    show_notes(results)
+
+def show_notes(results):
+    global window, settings
+    popup = tk.Toplevel(window)
+    popup.title(f"ac_editor - notes ({len(results)})")
+    listbox = tk.Listbox(popup,
+                         width=120,
+                         height=min(len(results), 20),
+                         font=(settings.font_type, settings.font_size),
+                         activestyle="dotbox")
+    for note in results:
+        snippet = " ".join(note.snippet.split())
+        listbox.insert(tk.END, f"{note.title}  |  {snippet}")
+    listbox.pack(fill="both", expand=True)
+
+    def choose(event=None):
+        selection = listbox.curselection()
+        popup.destroy()
+        if selection:
+            open_note(results[selection[0]])
+        return "break"
+
+    listbox.bind("<Return>", choose)
+    listbox.bind("<Double-Button-1>", choose)
+    listbox.bind("<Escape>", lambda event: popup.destroy())
+    listbox.selection_set(0)
+    listbox.activate(0)
+    listbox.focus_set()
+
+def open_note(note):
+    global files, notebook, database
+    if not note.is_unsaved:
+        if os.path.exists(note.path):
+            open_path(note.path)
+        else:
+            show_message(current_index(), f"{note.path} no longer exists")
+        return
+
+    # Still open in a tab, just switch to it
+    for rank in range(len(files)):
+        f = files[rank]
+        if f.is_unsaved and note.key == note_key(f):
+            notebook.select(rank)
+            return
+    file = File(path=None,
+                name=determine_name(),
+                rank=determine_rank(),
+                content=database.note_content(note.key),
+                is_unsaved=True)
+    add_file(file)
+    show_last()
+    # Only now that the tab exists, and without ever dropping the stored copy
+    database.reopen_note(note.key, file)
+
+#####################
+# Statistics (:stats)
+#####################
+def document_stats(index):
+    global codeviews, document_stats_list
+    if document_stats_list[index] == None:
+        stats = DocumentStats()
+        stats.build(codeview_contents(codeviews[index]))
+        codeviews[index].edit_listeners.append(stats.update)
+        document_stats_list[index] = stats
+    return document_stats_list[index]
+
+def stats():
+    global files
+    total = total_stats([document_stats(n) for n in range(len(files))])
+    tabs = "1 tab" if len(files) == 1 else f"{len(files)} tabs"
+    show_message(current_index(), f"{tabs}: {total.describe()}")
+
+#################################
+# Visual mode (v, V and operators)
+#################################
+# The selection runs from the visual_anchor mark to the cursor, both included
+def visual_range(codeview, linewise):
+    start = codeview.index("visual_anchor")
+    end = codeview.index("insert")
+    if codeview.compare(start, ">", end):
+        start, end = end, start
+    if linewise:
+        return (codeview.index(f"{start} linestart"), codeview.index(f"{end} lineend +1c"))
+    return (start, codeview.index(f"{end} +1c"))
+
+def show_selection(index):
+    global vim_controller, codeviews
+    codeview = codeviews[index]
+    codeview.tag_remove("sel", "1.0", "end")
+    start, end = visual_range(codeview, vim_controller.in_visual_line(index))
+    codeview.tag_add("sel", start, end)
+
+def enter_visual(linewise):
+    global vim_controller, codeviews
+    index = current_index()
+    codeview = codeviews[index]
+    if not vim_controller.in_visual(index):
+        codeview.mark_set("visual_anchor", "insert")
+        codeview.mark_gravity("visual_anchor", "left")
+    # v in VISUAL (or V in VISUAL LINE) leaves it, the other one switches kind
+    elif vim_controller.in_visual_line(index) == linewise:
+        exit_visual(index)
+        return
+    vim_controller.switch_visual(index, linewise)
+
+def exit_visual(index):
+    global vim_controller, codeviews
+    codeviews[index].tag_remove("sel", "1.0", "end")
+    vim_controller.switch_normal(index)
+
+def v():
+    enter_visual(False)
+
+def V():
+    enter_visual(True)
+
+def d():
+    global vim_controller, registers, files
+    index = current_index()
+    if not vim_controller.in_visual(index):
+        return
+    codeview = codeviews[index]
+    linewise = vim_controller.in_visual_line(index)
+    start, end = visual_range(codeview, linewise)
+    name = command_register(vim_controller.current_command(index))
+    registers.set(name, codeview.get(start, end), linewise)
+    # The last line has no newline of its own to delete, take the one before it
+    if linewise and codeview.compare(end, "==", "end") and codeview.compare(start, ">", "1.0"):
+        start = codeview.index(f"{start} -1c")
+    with BatchEdit(codeview) as batch:
+        batch.delete(start, end)
+    files[index].has_changed = True
+    exit_visual(index)
+    codeview.mark_set("insert", f"{start} linestart" if linewise else start)
+    see_insert(codeview)
+
+def y():
+    global vim_controller, registers
+    index = current_index()
+    if not vim_controller.in_visual(index):
+        return
+    codeview = codeviews[index]
+    linewise = vim_controller.in_visual_line(index)
+    start, end = visual_range(codeview, linewise)
+    text = codeview.get(start, end)
+    registers.set(command_register(vim_controller.current_command(index)), text, linewise)
+    exit_visual(index)
+    codeview.mark_set("insert", start)
+    see_insert(codeview)
+    lines = text.count("\n")
+    if lines > 2:
+        show_message(index, f"{lines} lines yanked")
+
+def p():
+    global vim_controller, registers, files
+    index = current_index()
+    codeview = codeviews[index]
+    name = command_register(vim_controller.current_command(index))
+    register = registers.get(name)
+    if register == None:
+        show_message(index, "E353: Nothing in register " + (name if name != None else UNNAMED))
+        return
+    text = register.text
+    if vim_controller.in_visual(index):
+        linewise = vim_controller.in_visual_line(index)
+        start, end = visual_range(codeview, linewise)
+        replaced = codeview.get(start, end)
+        if linewise and not register.linewise:
+            text += "\n"
+        replace_block(codeview, start, end, text)
+        # Like vim, what was replaced can be put somewhere else
+        registers.set(None, replaced, linewise)
+        exit_visual(index)
+        codeview.mark_set("insert", start)
+    elif register.linewise:
+        # Below the current line
+        line = codeview_line(codeview, "insert")
+        with BatchEdit(codeview) as batch:
+            if line == last_line(codeview):
+                batch.insert(f"{line}.end", "\n" + text[:-1])
+            else:
+                batch.insert(f"{line + 1}.0", text)
+        codeview.mark_set("insert", f"{line + 1}.0")
+    else:
+        # After the cursor, unless the line is empty
+        start = codeview.index("insert" if codeview.compare("insert", "==", "insert lineend") else "insert +1c")
+        with BatchEdit(codeview) as batch:
+            batch.insert(start, text)
+        codeview.mark_set("insert", f"{start} +{max(len(text) - 1, 0)}c")
+    files[index].has_changed = True
+    see_insert(codeview)
+
+# Replaces start..end with text in one edit. The replace drops every tag on the
+# old text, so closed folds around it are put back, and the ones inside it too when
+# text has as many lines as before. Blocks larger than the pool's are highlighted
+# again there instead of on the Tk thread.
+def replace_block(codeview, start, end, text):
+    first = codeview_line(codeview, start)
+    last = codeview_line(codeview, end)
+    added = text.count("\n") - (last - first)
+    folds = fold_ranges(codeview, first, last)
+    large = max(last - first, text.count("\n")) >= BLOCK_LINES
+    with BatchEdit(codeview, highlight=not large) as batch:
+        batch.replace(start, end, text)
+    for tag, header, fold_last in folds:
+        if added == 0 or (header < first and fold_last >= last):
+            codeview.tag_add(tag, f"{header}.end", f"{fold_last + added}.end")
+    if large:
+        highlight(codeview, retagging=True)
+
+# > and < work on whole lines even in VISUAL, and replace them in one edit
+# rather than one Tk call per line
+def shift_lines(dedent):
+    global vim_controller, files
+    index = current_index()
+    if not vim_controller.in_visual(index):
+        return
+    codeview = codeviews[index]
+    start, end = visual_range(codeview, True)
+    first = codeview_line(codeview, start)
+    last = codeview_line(codeview, f"{end} -1c")
+    lines = codeview.get(f"{first}.0", f"{last}.end").split("\n")
+    shifted = list(lines)
+    if dedent:
+        for line, n in dedent_columns(first, lines, len(INDENT)):
+            shifted[line - first] = lines[line - first][n:]
+    else:
+        for line in indent_lines(first, lines):
+            shifted[line - first] = INDENT + lines[line - first]
+    if shifted != lines:
+        replace_block(codeview, f"{first}.0", f"{last}.end", "\n".join(shifted))
+        files[index].has_changed = True
+    exit_visual(index)
+    codeview.mark_set("insert", f"{first}.0")
+
+def greater():
+    shift_lines(dedent=False)
+
+def less():
+    shift_lines(dedent=True)
+
+def tilde():
+    global vim_controller, files
+    index = current_index()
+    if not vim_controller.in_visual(index):
+        return
+    codeview = codeviews[index]
+    start, end = visual_range(codeview, vim_controller.in_visual_line(index))
+    replace_block(codeview, start, end, codeview.get(start, end).swapcase())
+    files[index].has_changed = True
+    exit_visual(index)
+    codeview.mark_set("insert", start)
+
+##########################
+# Save history (:history)
+##########################
+def history():
+    global files, database
+    index = current_index()
+    file = files[index]
+    if file.is_unsaved:
+        show_message(index, "History is kept for saved files, :w first")
+        return
+    versions = database.history(file.path)
+    if len(versions) == 0:
+        show_message(index, f"No saved versions of {file.name}")
+        return
+    show_history(codeviews[index], file, versions)
+
+def show_history(codeview, file, versions):
+    global window, settings
+    popup = tk.Toplevel(window)
+    popup.title(f"ac_editor - history of {file.name} ({len(versions)})")
+    listbox = tk.Listbox(popup,
+                         width=80,
+                         height=min(len(versions), 20),
+                         font=(settings.font_type, settings.font_size),
+                         activestyle="dotbox")
+    for version in versions:
+        listbox.insert(tk.END, version.describe())
+    listbox.pack(fill="both", expand=True)
+
+    def choose(event=None):
+        selection = listbox.curselection()
+        popup.destroy()
+        if selection:
+            restore_version(codeview, file, versions[selection[0]])
+        return "break"
+
+    listbox.bind("<Return>", choose)
+    listbox.bind("<Double-Button-1>", choose)
+    listbox.bind("<Escape>", lambda event: popup.destroy())
+    listbox.selection_set(0)
+    listbox.activate(0)
+    listbox.focus_set()
+
+# Puts the version in the buffer as one undoable edit, it's only written with :w
+def restore_version(codeview, file, version):
+    global files, codeviews, database
+    # The tab may have been closed while the list was open
+    if codeview not in codeviews:
+        return
+    index = codeviews.index(codeview)
+    content = database.version_content(file.path, version.number)
+    if content == None:
+        show_message(index, f"Version {version.number} is no longer stored")
+        return
+    edits = line_edits(codeview_contents(codeview), content)
+    if len(edits) > 0:
+        apply_edits(codeview, edits)
+        files[index].has_changed = True
+    notebook.select(index)
+    show_message(index, f"Restored v{version.number}, :w to keep it")
+
+#############################################
+# Keyword completion (ctrl + n, ctrl + p)
+#############################################
+def word_index(index):
+    global codeviews, word_indexes
+    if word_indexes[index] == None:
+        words = WordIndex()
+        words.build(codeview_contents(codeviews[index]))
+        codeviews[index].edit_listeners.append(lambda first, old, new: words.update(old, new))
+        word_indexes[index] = words
+    return word_indexes[index]
+
+def complete(direction):
+    global vim_controller, completion, codeviews
+    index = current_index()
+    if not vim_controller.in_insert(index):
+        return None
+    codeview = codeviews[index]
+    # Same place we left off, so keep cycling through the same candidates
+    if completion == None or completion.codeview != codeview or codeview.index("insert") != completion.end:
+        before = codeview.get("insert linestart", "insert")
+        match = re.search("\\w+$", before)
+        if match == None:
+            return "break"
+        prefix = match.group()
+        # Current tab first, then the other open tabs
+        order = [index] + [n for n in range(len(codeviews)) if n != index]
+        candidates = merge_candidates([word_index(n).complete(prefix) for n in order])
+        if len(candidates) == 0:
+            show_message(index, f"No completions for {prefix}")
+            return "break"
+        completion = Completion(codeview, codeview.index(f"insert -{len(prefix)} c"), prefix, candidates)
+    word = completion.step(direction)
+    codeview.delete(completion.start, "insert")
+    codeview.insert(completion.start, word)
+    completion.end = codeview.index("insert")
+    files[index].has_changed = True
+    position = completion.position + 1
+    total = len(completion.choices) - 1
+    show_message(index, f"match {position} of {total}" if position <= total else "back at original")
+    return "break"
+
+###############################
+# Folding (za, zc, zo, zM, zR)
+###############################
+def structure_index(index):
+    global codeviews, structure_indexes
+    structure = structure_indexes[index]
+    if structure == None:
+        structure = StructureIndex(uses_headings(files[index]))
+        structure.build(codeview_contents(codeviews[index]))
+        codeviews[index].edit_listeners.append(structure.update)
+        structure_indexes[index] = structure
+    return structure
+
+# The closed fold whose header is line, if any
+def fold_tag_at(codeview, line):
+    start = codeview.index(f"{line}.end")
+    for tag in codeview.tag_names(start):
+        if tag.startswith(FOLD_TAG) and str(codeview.tag_ranges(tag)[0]) == start:
+            return tag
+    return None
+
+# Hides everything from the end of the header line to the end of the last line,
+# so the header is followed directly by the line after the fold
+def close_fold(codeview, header, last):
+    global fold_count
+    if fold_tag_at(codeview, header) != None:
+        return
+    fold_count += 1
+    tag = f"{FOLD_TAG}{fold_count}"
+    codeview.tag_configure(tag, elide=True)
+    codeview.tag_add(tag, f"{header}.end", f"{last}.end")
+    # The cursor can't stay in text that isn't shown
+    if header < codeview_line(codeview, "insert") <= last:
+        codeview.mark_set("insert", f"{header}.0")
+
+# Closed folds overlapping lines first..last, as (tag, header, last)
+def fold_ranges(codeview, first, last):
+    folds = []
+    for tag in codeview.tag_names():
+        if tag.startswith(FOLD_TAG):
+            ranges = codeview.tag_ranges(tag)
+            for n in range(0, len(ranges), 2):
+                header = codeview_line(codeview, ranges[n])
+                fold_last = codeview_line(codeview, ranges[n + 1])
+                if header <= last and fold_last >= first:
+                    folds.append((tag, header, fold_last))
+    return folds
+
+# The lines hidden by closed folds, as (first, last) ranges, nested ones included
+def folded_lines(codeview):
+    return [(header + 1, last) for _, header, last in fold_ranges(codeview, 1, last_line(codeview))]
+
+# Highlighting skips what is folded away, it carries on once a fold opens
+def fold_opened(codeview):
+    global highlight_jobs
+    for job in highlight_jobs:
+        if job.codeview == codeview:
+            job.waiting = False
+    if len(highlight_jobs) > 0:
+        schedule_highlighting()
+
+def no_fold(index):
+    show_message(index, "E490: No fold found")
+
+def za():
+    index = current_index()
+    codeview = codeviews[index]
+    line = codeview_line(codeview, "insert")
+    tag = fold_tag_at(codeview, line)
+    if tag != None:
+        codeview.tag_delete(tag)
+        fold_opened(codeview)
+        return
+    fold = structure_index(index).fold_at(line)
+    if fold == None:
+        return no_fold(index)
+    close_fold(codeview, fold[0], fold[2])
+    see_insert(codeview)
+
+def zc():
+    index = current_index()
+    codeview = codeviews[index]
+    fold = structure_index(index).fold_at(codeview_line(codeview, "insert"))
+    if fold == None:
+        return no_fold(index)
+    close_fold(codeview, fold[0], fold[2])
+    see_insert(codeview)
+
+def zo():
+    index = current_index()
+    codeview = codeviews[index]
+    tag = fold_tag_at(codeview, codeview_line(codeview, "insert"))
+    if tag == None:
+        return no_fold(index)
+    codeview.tag_delete(tag)
+    fold_opened(codeview)
+
+# Closes the outermost folds, the ones inside them stay as they were
+def zM():
+    index = current_index()
+    codeview = codeviews[index]
+    for header, _, last in structure_index(index).top_level_folds():
+        close_fold(codeview, header, last)
+    see_insert(codeview)
+
+def zR():
+    codeview = current_codeview()
+    for tag in codeview.tag_names():
+        if tag.startswith(FOLD_TAG):
+            codeview.tag_delete(tag)
+    fold_opened(codeview)
+
+###############################
+# Background highlighting
+###############################
+def highlight(codeview, retagging=False):
+    global tokenizer
+    if not uses_tokens(codeview._lexer):
+        return
+    job = HighlightJob(codeview)
+    job.retagging = retagging
+    args = (tokenize_blocks, codeview_contents(codeview), lexer_spec(codeview._lexer))
+    try:
+        future = tokenizer.submit(*args)
+    except BrokenExecutor:
+        # A worker died (e.g. killed when out of memory) and the pool refuses any
+        # more work. Forking a new one now that Tk exists isn't safe, threads are.
+        tokenizer.shutdown(wait=False, cancel_futures=True)
+        tokenizer = ThreadPoolExecutor(pool_size())
+        future = tokenizer.submit(*args)
+    when_done(future, lambda future: highlight_ready(job, future))
+
+def highlight_ready(job, future):
+    global codeviews, highlight_jobs
+    if job.codeview not in codeviews:
+        job.finish()
+    elif isinstance(future.exception(), BrokenExecutor):
+        # The pool broke while this was queued, highlight() replaces it
+        job.finish()
+        highlight(job.codeview, retagging=job.retagging)
+    elif future.exception() != None:
+        # e.g. a worker was killed, highlight the old way rather than not at all
+        job.finish()
+        job.codeview.highlight_all()
+    elif job.stale:
+        job.finish()
+        highlight(job.codeview, retagging=True)
+    else:
+        job.blocks = future.result()
+        highlight_jobs.append(job)
+        schedule_highlighting()
+
+def schedule_highlighting():
+    global window, highlight_scheduled
+    if not highlight_scheduled:
+        highlight_scheduled = True
+        window.after_idle(apply_highlighting)
+
+# One block per idle callback, current tab first, so a keypress
+# never waits for more than one block. Jobs whose blocks left are all folded
+# away wait for fold_opened.
+def apply_highlighting():
+    global codeviews, highlight_jobs, highlight_scheduled
+    highlight_scheduled = False
+    jobs = [j for j in highlight_jobs if not j.waiting]
+    if len(jobs) == 0:
+        return
+    current = current_codeview()
+    job = next((j for j in jobs if j.codeview == current), jobs[0])
+    if job.codeview not in codeviews or job.stale:
+        highlight_jobs.remove(job)
+        job.finish()
+        # Blocks already tagged moved with the edits, the rest would land on the wrong text
+        if job.stale and job.codeview in codeviews:
+            highlight(job.codeview, retagging=True)
+    else:
+        job.apply_block(codeview_line(job.codeview, "@0,0"), folded_lines(job.codeview))
+        if job.done():
+            highlight_jobs.remove(job)
+            job.finish()
+    if any(not j.waiting for j in highlight_jobs):
+        schedule_highlighting()
+
+###############################
+# Files sent by later launches
+###############################
+def poll_instance():
+    global window, instance
+    requests = instance.pending()
+    for request in requests:
+        open_paths(request.paths)
+        if request.stream != None:
+            open_stream(request.stream)
+    if requests:
+        window.deiconify()
+        window.lift()
+        window.focus_force()
+    window.after(INSTANCE_POLL_MS, poll_instance)
+
+###########################################
+# Streaming a pipe into a tab (ac_editor -)
+###########################################
+def open_stream(stream):
+    global codeviews, window
+    file = File(path=None,
+                name=determine_name(),
+                rank=determine_rank(),
+                content=None,
+                is_unsaved=True)
+    add_file(file)
+    show_last()
+    codeview = codeviews[-1]
+    # The undo stack would keep a copy of everything streamed in, tail mode or not
+    codeview.config(undo=False)
+    window.after(STREAM_POLL_MS, lambda: poll_stream(codeview, stream))
+
+def poll_stream(codeview, stream):
+    global codeviews, window, files
+    if codeview not in codeviews:
+        stream.cancelled = True
+        return
+    text, closed = stream.drain()
+    if text != "":
+        # Keep following the output if the view was already at the bottom
+        follow = codeview.yview()[1] >= 1.0
+        with BatchEdit(codeview) as batch:
+            batch.insert("end-1c", text)
+        if stream.tail != None:
+            excess = last_line(codeview) - stream.tail - 1
+            # Whole lines going away don't need highlighting again
+            if excess > 0:
+                with BatchEdit(codeview, highlight=False) as batch:
+                    batch.delete("1.0", f"{excess + 1}.0")
+        if follow:
+            codeview.see("end")
+    if closed:
+        codeview.config(undo=True)
+        show_message(codeviews.index(codeview), "End of input")
+        return
+    window.after(STREAM_POLL_MS, lambda: poll_stream(codeview, stream))
+
 #######
 # Main
 #######
 if __name__ == "__main__":
-    window.title("ac_editor")
-    icon = make_icon("src/assets/logo.png")
-    window.wm_iconphoto(False, icon)
-    ttk.Style(window).theme_use("clam")
-
-    notebook.grid(row=0, column=0, sticky="nsew")
-    vim_controller.label_grid()
-    window.grid_rowconfigure(0, weight=1)
-    window.grid_columnconfigure(0, weight=1)
-    window.protocol("WM_DELETE_WINDOW", lambda: end())
-
-    window.bind("<Control-s>", WINDOW_EVENTS["save"])
-    window.bind("<Control-Alt-s>", WINDOW_EVENTS["save_as"])
-    window.bind("<Control-o>", WINDOW_EVENTS["load"])
-    window.bind("<Control-n>", WINDOW_EVENTS["new"])
-    notebook.bind("<<NotebookTabChanged>>", WINDOW_EVENTS["tab_change"])
-
-    data = database.load_settings()
+    with trace.phase("window setup"):
+        window.title("ac_editor")
+        icon = make_icon("src/assets/logo.png")
+        window.wm_iconphoto(False, icon)
+        ttk.Style(window).theme_use("clam")
+
+        notebook.grid(row=0, column=0, sticky="nsew")
+        vim_controller.label_grid()
+        window.grid_rowconfigure(0, weight=1)
+        window.grid_columnconfigure(0, weight=1)
+        window.protocol("WM_DELETE_WINDOW", lambda: end())
+
+        window.bind("<Control-s>", WINDOW_EVENTS["save"])
+        window.bind("<Control-Alt-s>", WINDOW_EVENTS["save_as"])
+        window.bind("<Control-o>", WINDOW_EVENTS["load"])
+        window.bind("<Control-n>", WINDOW_EVENTS["new"])
+        window.bind_class("MacroRecorder", "<Key>", record_key)
+        notebook.bind("<<NotebookTabChanged>>", WINDOW_EVENTS["tab_change"])
+
+    with trace.phase("load_settings"):
+        data = database.load_settings()
     if data:
         colour, font_type, font_size = data
         settings.colour    = colour
         settings.font_type = font_type
         settings.font_size = font_size
 
-    db_files = database.load_files()
+    with trace.phase("load_files"):
+        db_files = database.load_files()
+
+    with trace.phase("restore tabs", count=len(db_files)):
+        if len(db_files) == 0:
+            file = File(path=None, 
+                        name="New 1",
+                        rank=1,
+                        content=None,
+                        is_unsaved=True)
+            add_file(file)
+        else:
+            for db_file in db_files:
+                # Sessions from older versions could have a file open twice
+                if not db_file.is_unsaved and document_index(db_file.path) != None:
+                    continue
+                with trace.phase("add_file " + db_file.name, path=db_file.path, unsaved=bool(db_file.is_unsaved)):
+                    add_file(db_file)
 
-    if len(db_files) == 0:
-        file = File(path=None, 
-                    name="New 1",
-                    rank=1,
-                    content=None,
-                    is_unsaved=True)
-        add_file(file)
-    else:
-        for db_file in db_files:
-            add_file(db_file)
+        show_last()
 
-    show_last()
+    open_paths([p for p in arguments.paths if p != "-"])
+    if "-" in arguments.paths:
+        stream = StreamBuffer(arguments.tail)
+        stream.start_reader(sys.stdin.buffer)
+        open_stream(stream)
+    window.after(INSTANCE_POLL_MS, poll_instance)
+    # Idle callbacks run after Tk's own pending redraws, so this is roughly first paint
+    window.after_idle(trace.finish)
     window.mainloop()
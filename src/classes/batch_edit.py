@@ -0,0 +1,122 @@
+# CodeView re-highlights and fires <<ContentChanged>> on every insert/delete that
+# goes through its command proxy. For large groups of edits that is a pygments pass
+# and several Tcl round trips per edit, so BatchEdit talks to the underlying Tk text
+# command directly and highlights only the touched lines, once, when the batch is
+# done. The whole batch is also grouped into a single undo step. Edit listeners on
+# the EditorView are still told about every edit.
+#
+# Batches don't nest. A BatchEdit opened while another one is active on the same
+# EditorView (e.g. an operator inside a macro replay) just adds to the outer one.
+
+# Touched lines at most this far apart are highlighted together, one pygments
+# pass over a few untouched lines is cheaper than a Tk round trip per line
+MAX_GAP_LINES = 20
+
+
+# Merges (first, last) line ranges that overlap or are at most gap lines apart
+def merge_ranges(ranges, gap=0):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + gap + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class BatchEdit:
+    def __init__(self, codeview, highlight=True):
+        self.codeview = codeview
+        self.highlight = highlight
+        # Marks at the first and last line of each touched range, Tk moves them
+        # along with the edits made after
+        self.marks = []
+        self.touched = False
+        self.autoseparators = None
+        self.outer = None
+
+    def __enter__(self):
+        if self.codeview.batch is not None:
+            self.outer = self.codeview.batch
+            return self.outer
+        self.codeview.batch = self
+        self.autoseparators = self.codeview.cget("autoseparators")
+        self.codeview.config(autoseparators=False)
+        self.codeview.edit_separator()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outer is not None:
+            return False
+        self.codeview.batch = None
+        self.codeview.edit_separator()
+        self.codeview.config(autoseparators=self.autoseparators)
+        if self.marks:
+            ranges = [(self.line_of(first), self.line_of(last)) for first, last in self.marks]
+            self.call("mark", "unset", *[mark for pair in self.marks for mark in pair])
+            self.marks = []
+            self.rehighlight(merge_ranges(ranges, MAX_GAP_LINES))
+        if self.touched:
+            self.codeview.event_generate("<<ContentChanged>>")
+        return False
+
+    def call(self, *args):
+        return self.codeview.tk.call(self.codeview._orig, *args)
+
+    def index(self, index):
+        return str(self.call("index", index))
+
+    def line_of(self, index):
+        return int(self.index(index).split(".")[0])
+
+    def insert(self, index, text, *tags):
+        line = self.line_of(index)
+        self.codeview.observe_edit(index, index, lambda: self.call("insert", index, text, *tags))
+        self.touch(line, line, text.count("\n"))
+
+    def delete(self, start, end):
+        first = self.line_of(start)
+        last = self.line_of(end)
+        self.codeview.observe_edit(start, end, lambda: self.call("delete", start, end))
+        self.touch(first, last, 0)
+
+    def replace(self, start, end, text, *tags):
+        first = self.line_of(start)
+        last = self.line_of(end)
+        def apply():
+            self.call("delete", start, end)
+            if text:
+                self.call("insert", start, text, *tags)
+        self.codeview.observe_edit(start, end, apply)
+        self.touch(first, last, text.count("\n"))
+
+    # An edit replaced lines first..last with inserted_lines + 1 lines. Edits
+    # usually come in order, bottom to top for :s, so the range is only merged
+    # with the one touched last.
+    def touch(self, first, last, inserted_lines):
+        self.touched = True
+        if not self.highlight:
+            return
+        end = first + inserted_lines
+        if self.marks:
+            first_mark, last_mark = self.marks[-1]
+            previous_first, previous_last = self.line_of(first_mark), self.line_of(last_mark)
+            if first <= previous_last + MAX_GAP_LINES + 1 and previous_first <= end + MAX_GAP_LINES + 1:
+                if first < previous_first:
+                    self.call("mark", "set", first_mark, f"{first}.0")
+                if end > previous_last:
+                    self.call("mark", "set", last_mark, f"{end}.0")
+                return
+        n = len(self.marks)
+        first_mark, last_mark = f"batch_first{n}", f"batch_last{n}"
+        for mark, line in ((first_mark, first), (last_mark, end)):
+            self.call("mark", "set", mark, f"{line}.0")
+            self.call("mark", "gravity", mark, "left")
+        self.marks.append((first_mark, last_mark))
+
+    def rehighlight(self, ranges):
+        for first, last in ranges:
+            if first == last:
+                self.codeview.highlight_line(f"{first}.0")
+            else:
+                self.codeview.highlight_area(first, last)
@@ -1,15 +1,29 @@
 import os
+import time
+import hashlib
 import sqlite3
 from .file import File
+from .note import Note, note_key, archived_key, archived_title, fts_query
+from .history import (Version, make_delta, apply_delta, make_snapshot, read_snapshot,
+                      SNAPSHOT_INTERVAL, MAX_VERSIONS, MAX_HISTORY_BYTES)
+
+# How many results :notes shows, and how many tokens of context each snippet has
+NOTES_LIMIT = 50
+SNIPPET_TOKENS = 12
 
 
 class Database():
     DB_DIRECTORY = "./database/"
     DB_PATH = "./database/editor_data.db"
 
-    def __init__(self):
-        os.makedirs(self.DB_DIRECTORY, exist_ok=True)
-        self.conn = sqlite3.connect(self.DB_PATH)
+    # path is only overridden by tests and benchmarks, e.g. ":memory:"
+    def __init__(self, path=None):
+        if path == None:
+            os.makedirs(self.DB_DIRECTORY, exist_ok=True)
+            path = self.DB_PATH
+        self.conn = sqlite3.connect(path)
+        # Latest (version, content) per path, so a save doesn't rebuild the last version to diff against
+        self.history_cache = {}
         self.initialize_tables()
 
     def table_exists(self, name):
@@ -41,8 +55,46 @@ class Database():
                                 IS_UNSAVED INTEGER NOT NULL
                             )
                         """
+        # Rowids of notes and notes_index match up
+        notes = """ CREATE TABLE notes
+                            (
+                                KEY        TEXT    NOT NULL UNIQUE,
+                                TITLE      TEXT    NOT NULL,
+                                PATH       TEXT    NOT NULL,
+                                IS_UNSAVED INTEGER NOT NULL,
+                                HASH       TEXT    NOT NULL,
+                                UPDATED    REAL    NOT NULL
+                            )
+                        """
+        notes_index = """ CREATE VIRTUAL TABLE notes_index USING fts5
+                            (
+                                TITLE,
+                                CONTENT
+                            )
+                        """
+        # One row per save, DATA is a snapshot or a delta against VERSION - 1
+        history = """ CREATE TABLE history
+                            (
+                                PATH       TEXT    NOT NULL,
+                                VERSION    INTEGER NOT NULL,
+                                SAVED      REAL    NOT NULL,
+                                SNAPSHOT   INTEGER NOT NULL,
+                                LENGTH     INTEGER NOT NULL,
+                                HASH       TEXT    NOT NULL,
+                                DATA       BLOB    NOT NULL,
+                                PRIMARY KEY (PATH, VERSION)
+                            )
+                        """
         self.create_table(settings, "settings")
         self.create_table(files, "files")
+        self.create_table(notes, "notes")
+        self.create_table(history, "history")
+        # Some SQLite builds don't include FTS5, :notes is just unavailable there
+        try:
+            self.create_table(notes_index, "notes_index")
+            self.has_notes = True
+        except sqlite3.OperationalError:
+            self.has_notes = False
         self.conn.commit()
 
     def load_files(self):
@@ -83,4 +135,148 @@ class Database():
     def load_settings(self):
         cursor = self.conn.execute("SELECT * FROM settings LIMIT 1")
         return cursor.fetchone()
-    
+
+    # Re-indexes a buffer if its content changed since it was last indexed.
+    # Returns whether anything was written.
+    def index_note(self, file, content):
+        if not self.has_notes:
+            return False
+        key = note_key(file)
+        digest = hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        row = self.conn.execute("SELECT rowid, HASH FROM notes WHERE KEY = ?", (key,)).fetchone()
+        if row != None and row[1] == digest:
+            return False
+        data = (file.name, file.path, int(bool(file.is_unsaved)), digest, time.time())
+        if row == None:
+            cursor = self.conn.execute("INSERT INTO notes (TITLE, PATH, IS_UNSAVED, HASH, UPDATED, KEY) VALUES (?, ?, ?, ?, ?, ?)", data + (key,))
+            rowid = cursor.lastrowid
+        else:
+            rowid = row[0]
+            self.conn.execute("UPDATE notes SET TITLE = ?, PATH = ?, IS_UNSAVED = ?, HASH = ?, UPDATED = ? WHERE rowid = ?", data + (rowid,))
+            self.conn.execute("DELETE FROM notes_index WHERE rowid = ?", (rowid,))
+        self.conn.execute("INSERT INTO notes_index (rowid, TITLE, CONTENT) VALUES (?, ?, ?)", (rowid, file.name, content))
+        self.conn.commit()
+        return True
+
+    # Keeps a closed unsaved buffer searchable without tying it to its tab name
+    def archive_note(self, file):
+        if not self.has_notes:
+            return
+        data = (archived_key(file), archived_title(file), note_key(file))
+        self.conn.execute("UPDATE notes SET KEY = ?, TITLE = ? WHERE KEY = ?", data)
+        self.conn.commit()
+
+    # An archived note opened again in the tab file, it's keyed by that tab from
+    # now on. The stored content stays until the tab is indexed over it.
+    def reopen_note(self, key, file):
+        if not self.has_notes:
+            return
+        # Left over from a tab of the same name that never got archived
+        stale = self.conn.execute("SELECT rowid FROM notes WHERE KEY = ?", (note_key(file),)).fetchone()
+        if stale != None:
+            self.conn.execute("DELETE FROM notes WHERE rowid = ?", stale)
+            self.conn.execute("DELETE FROM notes_index WHERE rowid = ?", stale)
+        row = self.conn.execute("SELECT rowid FROM notes WHERE KEY = ?", (key,)).fetchone()
+        if row != None:
+            self.conn.execute("UPDATE notes SET KEY = ?, TITLE = ?, UPDATED = ? WHERE rowid = ?",
+                              (note_key(file), file.name, time.time(), row[0]))
+            self.conn.execute("UPDATE notes_index SET TITLE = ? WHERE rowid = ?", (file.name, row[0]))
+        self.conn.commit()
+
+    def remove_note(self, key):
+        if not self.has_notes:
+            return
+        row = self.conn.execute("SELECT rowid FROM notes WHERE KEY = ?", (key,)).fetchone()
+        if row != None:
+            self.conn.execute("DELETE FROM notes WHERE rowid = ?", row)
+            self.conn.execute("DELETE FROM notes_index WHERE rowid = ?", row)
+            self.conn.commit()
+
+    def search_notes(self, text):
+        query = fts_query(text)
+        if not self.has_notes or query == None:
+            return []
+        # Ranking and snippets happen inside FTS5 on the top results only,
+        # the join just picks up the metadata for those rows
+        cursor = self.conn.execute(""" SELECT notes.KEY, notes.TITLE, notes.PATH, notes.IS_UNSAVED, hits.SNIPPET
+                                       FROM
+                                       (
+                                           SELECT rowid, rank, snippet(notes_index, 1, '[', ']', '...', ?) AS SNIPPET
+                                           FROM notes_index
+                                           WHERE notes_index MATCH ?
+                                           ORDER BY rank
+                                           LIMIT ?
+                                       ) AS hits
+                                       JOIN notes ON notes.rowid = hits.rowid
+                                       ORDER BY hits.rank
+                                   """, (SNIPPET_TOKENS, query, NOTES_LIMIT))
+        return [Note(*row) for row in cursor.fetchall()]
+
+    def note_content(self, key):
+        row = self.conn.execute(""" SELECT notes_index.CONTENT FROM notes_index
+                                    JOIN notes ON notes.rowid = notes_index.rowid
+                                    WHERE notes.KEY = ?
+                                """, (key,)).fetchone()
+        return row[0] if row != None else ""
+
+    # Records content as the newest version of the file at path, unless it's the same
+    # as the last one. Returns whether anything was written.
+    def record_version(self, path, content):
+        path = os.path.abspath(path)
+        digest = hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+        last = self.conn.execute("SELECT VERSION, HASH FROM history WHERE PATH = ? ORDER BY VERSION DESC LIMIT 1", (path,)).fetchone()
+        if last != None and last[1] == digest:
+            return False
+        version = last[0] + 1 if last != None else 1
+        snapshot = self.conn.execute("SELECT MAX(VERSION) FROM history WHERE PATH = ? AND SNAPSHOT = 1", (path,)).fetchone()[0]
+        if last == None or snapshot == None or version - snapshot >= SNAPSHOT_INTERVAL:
+            data = make_snapshot(content)
+            is_snapshot = 1
+        else:
+            data = make_delta(self.version_content(path, last[0]), content)
+            is_snapshot = 0
+        row = (path, version, time.time(), is_snapshot, len(content), digest, data)
+        self.conn.execute("INSERT INTO history (PATH, VERSION, SAVED, SNAPSHOT, LENGTH, HASH, DATA) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        self.history_cache[path] = (version, content)
+        self.prune_history(path)
+        self.conn.commit()
+        return True
+
+    # Drops the oldest versions until the file is within MAX_VERSIONS and
+    # MAX_HISTORY_BYTES, turning the new oldest one into a snapshot
+    def prune_history(self, path):
+        while True:
+            count, size, oldest = self.conn.execute("SELECT COUNT(*), SUM(LENGTH(DATA)), MIN(VERSION) FROM history WHERE PATH = ?", (path,)).fetchone()
+            if count <= 1 or (count <= MAX_VERSIONS and size <= MAX_HISTORY_BYTES):
+                return
+            first, is_snapshot = self.conn.execute("SELECT VERSION, SNAPSHOT FROM history WHERE PATH = ? AND VERSION > ? ORDER BY VERSION LIMIT 1", (path, oldest)).fetchone()
+            if not is_snapshot:
+                data = make_snapshot(self.version_content(path, first))
+                self.conn.execute("UPDATE history SET SNAPSHOT = 1, DATA = ? WHERE PATH = ? AND VERSION = ?", (data, path, first))
+            self.conn.execute("DELETE FROM history WHERE PATH = ? AND VERSION < ?", (path, first))
+
+    # Newest first
+    def history(self, path):
+        cursor = self.conn.execute("SELECT VERSION, SAVED, LENGTH FROM history WHERE PATH = ? ORDER BY VERSION DESC", (os.path.abspath(path),))
+        return [Version(*row) for row in cursor.fetchall()]
+
+    # Rebuilds a version from the closest snapshot at or before it, None if it isn't stored
+    def version_content(self, path, version):
+        path = os.path.abspath(path)
+        cached = self.history_cache.get(path)
+        if cached != None and cached[0] == version:
+            return cached[1]
+        cursor = self.conn.execute(""" SELECT VERSION, SNAPSHOT, DATA FROM history
+                                       WHERE PATH = ? AND VERSION <= ? AND VERSION >=
+                                       (
+                                           SELECT MAX(VERSION) FROM history
+                                           WHERE PATH = ? AND SNAPSHOT = 1 AND VERSION <= ?
+                                       )
+                                       ORDER BY VERSION
+                                   """, (path, version, path, version))
+        content = None
+        for number, is_snapshot, data in cursor:
+            content = read_snapshot(data) if is_snapshot else apply_delta(content, data)
+            if number == version:
+                return content
+        return None
@@ -0,0 +1,32 @@
+# Line, word and character counts for one buffer, kept up to date from edit
+# deltas so the status line never has to read the whole buffer. Words are
+# whitespace separated, like wc -w.
+
+class DocumentStats:
+    def __init__(self):
+        self.lines = 0
+        self.words = 0
+        self.chars = 0
+
+    def build(self, text):
+        self.lines = text.count("\n") + 1
+        self.words = len(text.split())
+        self.chars = len(text)
+
+    # old_text and new_text are whole lines, so words can't be split across the edges
+    def update(self, first, old_text, new_text):
+        self.lines += new_text.count("\n") - old_text.count("\n")
+        self.words += len(new_text.split()) - len(old_text.split())
+        self.chars += len(new_text) - len(old_text)
+
+    def describe(self):
+        return f"{self.lines:,} lines  {self.words:,} words  {self.chars:,} chars"
+
+
+def total_stats(stats_list):
+    total = DocumentStats()
+    for stats in stats_list:
+        total.lines += stats.lines
+        total.words += stats.words
+        total.chars += stats.chars
+    return total
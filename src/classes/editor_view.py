@@ -0,0 +1,52 @@
+from tkinter     import TclError
+from chlorophyll import CodeView
+
+# A CodeView that can tell other parts of the editor what an edit changed.
+# Listeners are called as listener(first_line, old_text, new_text) where old_text
+# is lines first_line.. of the buffer before the edit and new_text the same lines
+# after it, so they can keep indexes up to date without rescanning the buffer.
+# Nothing extra is done while there are no listeners.
+
+class EditorView(CodeView):
+    def __init__(self, *args, **kwargs):
+        self.edit_listeners = []
+        # The BatchEdit in progress, if any
+        self.batch = None
+        super().__init__(*args, **kwargs)
+
+    def raw(self, *args):
+        return self.tk.call(self._orig, *args)
+
+    def raw_line(self, index):
+        return int(str(self.raw("index", index)).split(".")[0])
+
+    # Runs apply() (which performs an insert/delete/replace covering start..end)
+    # and reports the lines it touched to the listeners
+    def observe_edit(self, start, end, apply):
+        if not self.edit_listeners:
+            return apply()
+        try:
+            first = self.raw_line(start)
+            last = self.raw_line(end)
+        except TclError:
+            # e.g. deleting sel.first when nothing is selected, CodeView ignores those
+            return apply()
+        # "end" is on the line after the last one, which the listeners don't have
+        lines_before = self.raw_line("end - 1 chars")
+        first = min(first, lines_before)
+        last = min(last, lines_before)
+        old_text = str(self.raw("get", f"{first}.0", f"{last}.end"))
+        result = apply()
+        new_last = last + self.raw_line("end - 1 chars") - lines_before
+        new_text = str(self.raw("get", f"{first}.0", f"{new_last}.end"))
+        for listener in self.edit_listeners:
+            listener(first, old_text, new_text)
+        return result
+
+    def _cmd_proxy(self, command, *args):
+        if command not in {"insert", "delete", "replace"} or not self.edit_listeners:
+            return super()._cmd_proxy(command, *args)
+        start, end = args[0], args[0]
+        if command != "insert":
+            end = args[1] if len(args) > 1 else f"{args[0]} + 1 chars"
+        return self.observe_edit(start, end, lambda: super(EditorView, self)._cmd_proxy(command, *args))
@@ -1,3 +1,5 @@
+import os
+
 # Files can change state from saved to unsaved while the user types in them. 
 # This explains the dual nature of this class. 
 
@@ -17,4 +19,9 @@ def extract_file(db_file):
                 rank=rank,
                 content=content,
                 is_unsaved=is_unsaved)
-    return file
\ No newline at end of file
+    return file
+
+# Paths that name the same file (through a symlink, .., or on Windows a different
+# case) have the same key, so a file is only ever open in one tab
+def document_key(path):
+    return os.path.normcase(os.path.realpath(path))
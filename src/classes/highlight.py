@@ -0,0 +1,130 @@
+import os
+import multiprocessing
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pygments
+
+# Opening a file used to highlight all of it on the Tk thread, one tag_add and
+# index call per token. Now the text is shown plain straight away, a pool lexes
+# it, and the tags are added back on the Tk thread a block of lines at a time
+# when it's idle, starting with the lines on screen.
+BLOCK_LINES = 500
+# Same as chlorophyll, plain text isn't tagged
+IGNORED_TOKENS = {"Token.Text", "Token.Text.Whitespace"}
+MAX_WORKERS = 4
+
+
+def pool_size():
+    return max(1, min(MAX_WORKERS, (os.cpu_count() or 2) - 1))
+
+
+# Workers are forked, and should be forked before Tk exists and before any other
+# thread is started. Spawned workers would import ac_editor again and open a window
+# each, so where fork isn't the default start method (Windows, and macOS, where
+# forking a process that has loaded the system frameworks isn't safe) lexing
+# happens on a thread instead, still off the Tk thread but sharing the GIL.
+def make_pool():
+    if multiprocessing.get_start_method(allow_none=False) == "fork":
+        return ProcessPoolExecutor(pool_size(), mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(pool_size())
+
+
+def warm_up():
+    return None
+
+
+# A Tk text widget's lexer, in a form that can be sent to a worker
+def lexer_spec(lexer):
+    return (type(lexer), dict(lexer.options))
+
+
+def uses_tokens(lexer):
+    return type(lexer).__name__ != "TextLexer"
+
+
+# Lexes text in a worker. Returns a list of blocks, (first_line, last_line, spans)
+# where spans maps a token name to an array of start line, start column, end line,
+# end column for each token of that type starting in the block. Arrays pickle as
+# raw bytes, so the result costs a fraction of the (token, text) pairs to send back.
+def tokenize_blocks(text, spec):
+    lexer_class, options = spec
+    # Leading and trailing newlines have to stay or the positions shift
+    lexer = lexer_class(**dict(options, stripnl=False))
+    blocks = []
+    spans = {}
+    block_start = 1
+    line, col = 1, 0
+    for token, value in pygments.lex(text, lexer):
+        newlines = value.count("\n")
+        if newlines == 0:
+            end_line, end_col = line, col + len(value)
+        else:
+            end_line, end_col = line + newlines, len(value) - value.rfind("\n") - 1
+        name = str(token)
+        if name not in IGNORED_TOKENS and value != "":
+            # Blocks cover every line, including ones without tokens
+            if line >= block_start + BLOCK_LINES:
+                next_start = block_start + BLOCK_LINES * ((line - block_start) // BLOCK_LINES)
+                blocks.append((block_start, next_start - 1, spans))
+                block_start = next_start
+                spans = {}
+            spans.setdefault(name, array("I")).extend((line, col, end_line, end_col))
+        line, col = end_line, end_col
+    blocks.append((block_start, max(line, block_start), spans))
+    return blocks
+
+
+def span_indices(spans):
+    return [f"{spans[n]}.{spans[n + 1]}" for n in range(0, len(spans), 2)]
+
+
+# Highlighting for one tab, from when its text is sent to the pool until the last
+# block is tagged. Any edit before then makes it stale, the caller then starts
+# over on the new text. Lines edited meanwhile are highlighted by CodeView itself.
+class HighlightJob:
+    def __init__(self, codeview):
+        self.codeview = codeview
+        self.blocks = None
+        self.stale = False
+        # Every block left is hidden by a closed fold
+        self.waiting = False
+        # Tags from an earlier, stale job have to be cleared first
+        self.retagging = False
+        codeview.edit_listeners.append(self.edited)
+
+    def edited(self, first, old_text, new_text):
+        self.stale = True
+
+    def finish(self):
+        if self.edited in self.codeview.edit_listeners:
+            self.codeview.edit_listeners.remove(self.edited)
+
+    def done(self):
+        return self.blocks != None and len(self.blocks) == 0
+
+    # Of the blocks not inside one of the hidden (first, last) line ranges, the one
+    # holding the first line on screen, otherwise the next one below it, otherwise
+    # the last one above it. None if there are none.
+    def next_block(self, visible_line, hidden=()):
+        shown = [n for n, block in enumerate(self.blocks)
+                 if not any(first <= block[0] and block[1] <= last for first, last in hidden)]
+        below = [n for n in shown if self.blocks[n][1] >= visible_line]
+        if below:
+            return below[0]
+        return shown[-1] if shown else None
+
+    # Adds one block's tags, one Tk call per token type. Hidden blocks are left
+    # for later, the job waits if there is nothing else.
+    def apply_block(self, visible_line, hidden=()):
+        n = self.next_block(visible_line, hidden)
+        if n == None:
+            self.waiting = True
+            return
+        first, last, spans = self.blocks.pop(n)
+        if self.retagging:
+            for tag in self.codeview.tag_names():
+                if tag.startswith("Token"):
+                    self.codeview.tag_remove(tag, f"{first}.0", f"{last}.end")
+        for name, positions in spans.items():
+            self.codeview.tag_add(name, *span_indices(positions))
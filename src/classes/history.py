@@ -0,0 +1,161 @@
+import json
+import time
+import zlib
+from bisect import bisect_left
+from difflib import SequenceMatcher
+
+# Every save of a file is kept in editor_data.db. Most versions are stored as a
+# line delta against the version before, every SNAPSHOT_INTERVAL-th one in full so
+# rebuilding any version applies at most that many deltas. Both are zlib compressed.
+SNAPSHOT_INTERVAL = 20
+# Per file, the oldest versions are dropped past either limit
+MAX_VERSIONS = 500
+MAX_HISTORY_BYTES = 16 << 20
+# See diff_lines
+WINDOW_LINES = 200
+
+
+class Version:
+    def __init__(self, number, saved, length):
+        self.number = number
+        self.saved = saved
+        self.length = length
+
+    def describe(self):
+        saved = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.saved))
+        return f"v{self.number}  |  {saved}  |  {self.length} chars"
+
+
+# Opcodes like SequenceMatcher.get_opcodes(), without "equal" ones. Comparing every
+# line with every other one is quadratic, so lines are numbered by content and
+# matched patience style instead: lines that occur once in both versions anchor the
+# diff, and only the stretches between anchors are compared, each on its own.
+# Stretches without anchors are compared line by line up to WINDOW_LINES a side,
+# past that they count as replaced.
+def diff_lines(old, new):
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in old]
+    b = [ids.setdefault(line, len(ids)) for line in new]
+    opcodes = []
+    # Stretches still to compare, the next one in order at the end
+    stretches = [(0, len(a), 0, len(b))]
+    while stretches:
+        i1, i2, j1, j2 = stretches.pop()
+        while i1 < i2 and j1 < j2 and a[i1] == b[j1]:
+            i1, j1 = i1 + 1, j1 + 1
+        while i1 < i2 and j1 < j2 and a[i2 - 1] == b[j2 - 1]:
+            i2, j2 = i2 - 1, j2 - 1
+        if i1 == i2 and j1 == j2:
+            continue
+        if i1 == i2:
+            opcodes.append(("insert", i1, i2, j1, j2))
+            continue
+        if j1 == j2:
+            opcodes.append(("delete", i1, i2, j1, j2))
+            continue
+        anchors = unique_matches(a, b, i1, i2, j1, j2)
+        if anchors:
+            # Anchors are equal lines, the stretches between them are compared next
+            bounds = [(i1 - 1, j1 - 1)] + anchors + [(i2, j2)]
+            for n in range(len(bounds) - 1, 0, -1):
+                stretches.append((bounds[n - 1][0] + 1, bounds[n][0], bounds[n - 1][1] + 1, bounds[n][1]))
+        elif i2 - i1 <= WINDOW_LINES and j2 - j1 <= WINDOW_LINES:
+            matcher = SequenceMatcher(None, a[i1:i2], b[j1:j2], autojunk=False)
+            for tag, k1, k2, l1, l2 in matcher.get_opcodes():
+                if tag != "equal":
+                    opcodes.append((tag, k1 + i1, k2 + i1, l1 + j1, l2 + j1))
+        else:
+            opcodes.append(("replace", i1, i2, j1, j2))
+    return opcodes
+
+
+# (i, j) pairs of lines that occur once in a[i1:i2] and once in b[j1:j2], the
+# longest run of them that is in order in both
+def unique_matches(a, b, i1, i2, j1, j2):
+    counts = {}
+    for n in range(i1, i2):
+        counts[a[n]] = counts.get(a[n], 0) + 1
+    in_a = {a[n]: n for n in range(i1, i2) if counts[a[n]] == 1}
+    counts = {}
+    for n in range(j1, j2):
+        counts[b[n]] = counts.get(b[n], 0) + 1
+    pairs = sorted((in_a[b[n]], n) for n in range(j1, j2) if counts[b[n]] == 1 and b[n] in in_a)
+    # Longest increasing run of j, patience sorting
+    tops = []
+    tails = []
+    previous = []
+    for k, (_, j) in enumerate(pairs):
+        pile = bisect_left(tops, j)
+        if pile == len(tops):
+            tops.append(j)
+            tails.append(k)
+        else:
+            tops[pile] = j
+            tails[pile] = k
+        previous.append(tails[pile - 1] if pile > 0 else -1)
+    anchors = []
+    k = tails[-1] if tails else -1
+    while k >= 0:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+# A delta is a list of [start, end] (copy those lines of the old version) and
+# strings (new lines, joined with newlines)
+def make_delta(old, new):
+    old_lines = old.split("\n")
+    new_lines = new.split("\n")
+    ops = []
+    copied = 0
+    for _, i1, i2, j1, j2 in diff_lines(old_lines, new_lines):
+        if i1 > copied:
+            ops.append([copied, i1])
+        if j2 > j1:
+            ops.append("\n".join(new_lines[j1:j2]))
+        copied = i2
+    if copied < len(old_lines):
+        ops.append([copied, len(old_lines)])
+    return zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"))
+
+
+def apply_delta(old, data):
+    old_lines = old.split("\n")
+    lines = []
+    for op in json.loads(zlib.decompress(data).decode("utf-8")):
+        if isinstance(op, str):
+            lines.extend(op.split("\n"))
+        else:
+            lines.extend(old_lines[op[0]:op[1]])
+    return "\n".join(lines)
+
+
+def make_snapshot(content):
+    return zlib.compress(content.encode("utf-8", "surrogatepass"))
+
+
+def read_snapshot(data):
+    return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+
+# The edits that turn the buffer text old into new, as ((line, col), (line, col), text)
+# ordered bottom to top like substitute's, so restoring a version only touches the
+# lines that differ
+def line_edits(old, new):
+    old_lines = old.split("\n")
+    new_lines = new.split("\n")
+    edits = []
+    for _, i1, i2, j1, j2 in reversed(diff_lines(old_lines, new_lines)):
+        text = "\n".join(new_lines[j1:j2])
+        if i1 < i2 and j1 < j2:
+            edits.append(((i1 + 1, 0), (i2, len(old_lines[i2 - 1])), text))
+        elif j1 < j2 and i1 < len(old_lines):
+            edits.append(((i1 + 1, 0), (i1 + 1, 0), text + "\n"))
+        elif j1 < j2:
+            edits.append(((i1, len(old_lines[i1 - 1])), (i1, len(old_lines[i1 - 1])), "\n" + text))
+        elif i2 < len(old_lines):
+            edits.append(((i1 + 1, 0), (i2 + 1, 0), ""))
+        else:
+            edits.append(((i1, len(old_lines[i1 - 1])), (i2, len(old_lines[i2 - 1])), ""))
+    return edits
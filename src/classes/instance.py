@@ -0,0 +1,180 @@
+import os
+import json
+import queue
+import socket
+import threading
+
+from .stream import StreamBuffer, CHUNK_SIZE
+
+# Only one editor runs per database directory. The first one listens on a Unix
+# socket next to editor_data.db, later launches send it their file paths and exit
+# before initializing Tk, pygments or SQLite. Platforms without AF_UNIX (Python on
+# Windows) just run every launch as its own editor, like before.
+#
+# A request is one line of JSON, {"paths": [...], "stream": bool, "tail": int or null},
+# followed for streams by the raw bytes of the stream until the client hangs up.
+SOCKET_PATH = "./database/ac_editor.sock"
+TIMEOUT = 0.5
+MAX_REQUEST = 1 << 20
+ACK = b"ok\n"
+
+
+def supported():
+    return hasattr(socket, "AF_UNIX")
+
+
+class Request:
+    def __init__(self, paths, stream=None):
+        self.paths = paths
+        self.stream = stream
+
+
+# Returns True if a running editor accepted the paths. With a stream (a binary file
+# object such as sys.stdin.buffer) this keeps copying it to the editor until EOF.
+def send_paths(paths, socket_path=SOCKET_PATH, stream=None, tail=None):
+    if not supported() or not os.path.exists(socket_path):
+        return False
+    header = {"paths": paths, "stream": stream != None, "tail": tail}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(TIMEOUT)
+            client.connect(socket_path)
+            client.sendall(json.dumps(header).encode("utf-8") + b"\n")
+            if stream != None:
+                # From here on the editor owns the stream, if it goes away the data is just lost
+                client.settimeout(None)
+                send_stream(client, stream)
+            client.shutdown(socket.SHUT_WR)
+            return client.recv(len(ACK)) == ACK or stream != None
+    except OSError:
+        return False
+
+
+def send_stream(client, stream):
+    read = getattr(stream, "read1", stream.read)
+    try:
+        while True:
+            data = read(CHUNK_SIZE)
+            if not data:
+                return
+            client.sendall(data)
+    except OSError:
+        return
+
+
+# Connecting without sending anything, the server just drops the connection
+def alive(socket_path=SOCKET_PATH):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(TIMEOUT)
+            client.connect(socket_path)
+            return True
+    except OSError:
+        return False
+
+
+class InstanceServer:
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self.requests = queue.Queue()
+        self.sock = None
+        self.thread = None
+
+    # Returns False if there's no AF_UNIX or another editor already owns the socket
+    def start(self):
+        if not supported():
+            return False
+        directory = os.path.dirname(self.socket_path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.socket_path)
+        except OSError:
+            # Either a live editor (lost the race to it) or a stale socket left by a crash
+            if alive(self.socket_path):
+                sock.close()
+                return False
+            try:
+                os.unlink(self.socket_path)
+                sock.bind(self.socket_path)
+            except OSError:
+                sock.close()
+                return False
+        sock.listen()
+        self.sock = sock
+        self.thread = threading.Thread(target=self.serve, args=(sock,), daemon=True)
+        self.thread.start()
+        return True
+
+    # Streams can stay open for as long as their producer runs, so every
+    # connection gets its own thread. The socket is passed in since close() may
+    # clear self.sock while this is between two accepts.
+    def serve(self, sock):
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            conn.settimeout(TIMEOUT)
+            data = b""
+            try:
+                while b"\n" not in data and len(data) < MAX_REQUEST:
+                    chunk = conn.recv(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    data += chunk
+                line, _, rest = data.partition(b"\n")
+                header = json.loads(line.decode("utf-8"))
+                paths = [str(p) for p in header["paths"]]
+                if not header.get("stream"):
+                    self.requests.put(Request(paths))
+                    conn.sendall(ACK)
+                    return
+                tail = header.get("tail")
+                stream = StreamBuffer(int(tail) if tail != None else None)
+                self.requests.put(Request(paths, stream))
+                conn.settimeout(None)
+                self.receive_stream(conn, stream, rest)
+                conn.sendall(ACK)
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def receive_stream(self, conn, stream, data):
+        try:
+            while not stream.cancelled:
+                if data:
+                    stream.feed(data)
+                data = conn.recv(CHUNK_SIZE)
+                if not data:
+                    break
+        finally:
+            stream.close()
+
+    # Every Request received since the last call
+    def pending(self):
+        requests = []
+        while True:
+            try:
+                requests.append(self.requests.get_nowait())
+            except queue.Empty:
+                return requests
+
+    def close(self):
+        sock = self.sock
+        if sock == None:
+            return
+        self.sock = None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
@@ -0,0 +1,68 @@
+import re
+
+# Keys that are recorded even though they don't produce a printable character
+SPECIAL_KEYS = ["Escape", "Return", "BackSpace"]
+# Nested @ inside a macro is allowed, but not forever
+MAX_DEPTH = 16
+
+
+# Just enough of a Tk event for the key handlers to work with
+class Key:
+    def __init__(self, char, keysym):
+        self.char = char
+        self.keysym = keysym
+
+    def is_typed(self):
+        return self.keysym == "Return" or self.char == "\t" or (self.char != "" and self.char.isprintable())
+
+    def typed_text(self):
+        return "\n" if self.keysym == "Return" else self.char
+
+
+def recordable(char, keysym):
+    return keysym in SPECIAL_KEYS or char == "\t" or (char != "" and char.isprintable())
+
+
+# Returns (count, register) for a replay command like 12@a
+def parse_macro(command):
+    digits = re.match("[0-9]*", command).group()
+    count = int(digits) if digits != "" else 1
+    return (count, command[-1])
+
+
+class MacroRecorder:
+    def __init__(self):
+        self.registers = {}
+        self.recording = None
+        self.keys = []
+        self.last_register = None
+        # Replay state, depth > 0 while a macro is being replayed
+        self.depth = 0
+        self.batch = None
+
+    def start(self, register):
+        self.recording = register
+        self.keys = []
+
+    # The key that stopped the recording (q) has already been recorded, drop it
+    def stop(self):
+        if self.keys:
+            self.keys.pop()
+        self.registers[self.recording] = self.keys
+        self.recording = None
+        self.keys = []
+
+    def record(self, char, keysym):
+        if self.recording != None and self.depth == 0 and recordable(char, keysym):
+            self.keys.append(Key(char, keysym))
+
+    def get(self, register):
+        if register == "@":
+            register = self.last_register
+        if register not in self.registers:
+            return None
+        self.last_register = register
+        return self.registers[register]
+
+    def replaying(self):
+        return self.depth > 0
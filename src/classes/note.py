@@ -0,0 +1,36 @@
+import os
+import time
+
+# Notes are every buffer whose content has been indexed for :notes. Saved files are
+# keyed by their absolute path, unsaved buffers by their tab name while open, and
+# an unsaved buffer that gets closed is archived under a unique key so the next
+# "New N" with the same name doesn't overwrite it.
+
+class Note:
+    def __init__(self, key, title, path, is_unsaved, snippet):
+        self.key = key
+        self.title = title
+        self.path = path
+        self.is_unsaved = is_unsaved
+        self.snippet = snippet
+
+def note_key(file):
+    if file.is_unsaved:
+        return "unsaved:" + file.name
+    return "file:" + os.path.abspath(file.path)
+
+def archived_key(file):
+    return "closed:" + str(time.time()) + ":" + file.name
+
+def archived_title(file):
+    return file.name + " (closed " + time.strftime("%Y-%m-%d %H:%M") + ")"
+
+# Turns what the user typed into an FTS5 query, every word has to appear and
+# the last one may be a prefix. Quoting keeps FTS5 syntax characters literal.
+def fts_query(text):
+    words = text.split()
+    if len(words) == 0:
+        return None
+    quoted = ['"' + w.replace('"', '""') + '"' for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
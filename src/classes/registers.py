@@ -0,0 +1,48 @@
+# Text registers for visual mode yanks, deletes and puts. Like vim, every yank or
+# delete also goes to the unnamed register, which is what p uses without a name.
+# These are separate from the macro registers in macro.py.
+UNNAMED = '"'
+
+
+class Register:
+    def __init__(self, text, linewise):
+        self.text = text
+        # Linewise text (from V) always holds whole lines ending in a newline
+        self.linewise = linewise
+
+
+class Registers:
+    def __init__(self):
+        self.registers = {}
+
+    def set(self, name, text, linewise):
+        register = Register(text, linewise)
+        self.registers[UNNAMED] = register
+        if name != None:
+            self.registers[name] = register
+
+    def get(self, name):
+        return self.registers.get(name if name != None else UNNAMED)
+
+
+# Returns the register named by a command like "ay, or None for plain y
+def command_register(command):
+    return command[1] if command.startswith(UNNAMED) else None
+
+
+# Lines that > indents, blank ones are left alone like in vim
+def indent_lines(first, lines):
+    return [first + n for n, line in enumerate(lines) if line != ""]
+
+
+# (line, columns) for every line < can dedent, one tab or up to width spaces
+def dedent_columns(first, lines, width):
+    changes = []
+    for n, line in enumerate(lines):
+        if line.startswith("\t"):
+            changes.append((first + n, 1))
+            continue
+        spaces = len(line) - len(line.lstrip(" "))
+        if spaces > 0:
+            changes.append((first + n, min(spaces, width)))
+    return changes
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+
+# Startup tracing is turned on with --trace-startup or AC_EDITOR_TRACE_STARTUP=1.
+# Each phase records wall-clock time and Python allocations (tracemalloc, so memory
+# allocated inside Tcl/Tk itself isn't included). tracemalloc makes every allocation
+# slower, so the times come out higher than without tracing. --trace-startup-time
+# or AC_EDITOR_TRACE_STARTUP=time records the times only. When the editor first
+# goes idle the trace is written as a JSON report plus a Chrome trace-event file
+# that can be opened in chrome://tracing or https://ui.perfetto.dev
+TRACE_ENV = "AC_EDITOR_TRACE_STARTUP"
+TIME_ONLY = "time"
+TRACE_DIRECTORY = "./traces/"
+
+
+class Phase:
+    def __init__(self, name, depth, args):
+        self.name = name
+        self.depth = depth
+        self.args = args
+        self.start = 0.0
+        self.end = 0.0
+        self.memory_start = 0
+        self.allocated = 0
+        self.peak = 0
+        self.child_peak = 0
+
+
+class StartupTrace:
+    def __init__(self, enabled, memory=True):
+        self.enabled = enabled
+        self.memory = memory
+        self.phases = []
+        self.stack = []
+        self.instants = []
+        self.finished = False
+        self.origin = time.perf_counter()
+        if enabled and memory:
+            tracemalloc.start()
+
+    # flag and time_only are the parsed command line flags, the environment
+    # variable turns tracing on as well
+    @staticmethod
+    def from_environment(flag=False, time_only=False):
+        value = os.environ.get(TRACE_ENV, "")
+        enabled = flag or time_only or value not in ("", "0")
+        memory = not time_only and value != TIME_ONLY
+        return StartupTrace(enabled, memory)
+
+    def active(self):
+        return self.enabled and not self.finished
+
+    def now_ms(self):
+        return (time.perf_counter() - self.origin) * 1000
+
+    # Usage: with trace.phase("load_files"): ...
+    # Does nothing once the trace has been written, or if tracing is off.
+    def phase(self, name, **args):
+        if not self.active():
+            return nullcontext()
+        return self._phase(name, args)
+
+    @contextmanager
+    def _phase(self, name, args):
+        phase = Phase(name, len(self.stack), args)
+        self.phases.append(phase)
+        self.stack.append(phase)
+        if self.memory:
+            phase.memory_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        phase.start = self.now_ms()
+        try:
+            yield phase
+        finally:
+            phase.end = self.now_ms()
+            current, peak = tracemalloc.get_traced_memory() if self.memory else (0, 0)
+            phase.allocated = current - phase.memory_start
+            phase.peak = max(peak, phase.child_peak) - phase.memory_start
+            self.stack.pop()
+            if self.stack:
+                parent = self.stack[-1]
+                parent.child_peak = max(parent.child_peak, phase.peak + phase.memory_start)
+
+    def mark(self, name):
+        if self.active():
+            self.instants.append((name, self.now_ms()))
+
+    def report(self):
+        return {
+            "pid": os.getpid(),
+            "total_ms": round(self.now_ms(), 3),
+            "instants": [{"name": name, "at_ms": round(at, 3)} for name, at in self.instants],
+            "phases": [
+                {
+                    "name": p.name,
+                    "depth": p.depth,
+                    "start_ms": round(p.start, 3),
+                    "duration_ms": round(p.end - p.start, 3),
+                    "allocated_bytes": p.allocated,
+                    "peak_bytes": p.peak,
+                    "args": p.args
+                }
+                for p in self.phases
+            ]
+        }
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        for p in self.phases:
+            args = dict(p.args)
+            args["allocated_bytes"] = p.allocated
+            args["peak_bytes"] = p.peak
+            events.append({
+                "name": p.name,
+                "cat": "startup",
+                "ph": "X",
+                "ts": round(p.start * 1000),
+                "dur": round((p.end - p.start) * 1000),
+                "pid": pid,
+                "tid": 0,
+                "args": args
+            })
+        for name, at in self.instants:
+            events.append({"name": name, "cat": "startup", "ph": "i", "s": "g",
+                           "ts": round(at * 1000), "pid": pid, "tid": 0})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summary(self):
+        if self.memory:
+            lines = [f"Startup trace ({self.now_ms():.1f} ms total, Python allocations only, "
+                     "times include tracemalloc overhead)"]
+        else:
+            lines = [f"Startup trace ({self.now_ms():.1f} ms total, times only)"]
+        lines.append(f"{'phase':<48} {'ms':>10} {'alloc KiB':>12} {'peak KiB':>12}")
+        for p in self.phases:
+            name = ("  " * p.depth + p.name)[:48]
+            lines.append(f"{name:<48} {p.end - p.start:>10.1f} "
+                         f"{p.allocated / 1024:>12.1f} {p.peak / 1024:>12.1f}")
+        for name, at in self.instants:
+            lines.append(f"{name:<48} {'@ ' + format(at, '.1f'):>10}")
+        return "\n".join(lines)
+
+    # Writes the report and stops tracing, returns the paths written
+    def finish(self):
+        if not self.active():
+            return None
+        self.mark("idle")
+        os.makedirs(TRACE_DIRECTORY, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        report_path = os.path.join(TRACE_DIRECTORY, f"startup-{stamp}.json")
+        chrome_path = os.path.join(TRACE_DIRECTORY, f"startup-{stamp}.trace.json")
+        with open(report_path, "w") as f:
+            json.dump(self.report(), f, indent=4)
+        with open(chrome_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        print(self.summary())
+        print(f"Startup trace written to {report_path} and {chrome_path}")
+        self.finished = True
+        if self.memory:
+            tracemalloc.stop()
+        return (report_path, chrome_path)
@@ -0,0 +1,68 @@
+import codecs
+import threading
+
+# Bytes read per call, read1() returns as soon as anything is available so a slow
+# producer still shows up line by line
+CHUNK_SIZE = 1 << 16
+
+
+# Text arriving from a pipe (stdin, or a socket from another launch) on a reader
+# thread, waiting to be drained into a tab by the Tk thread. In tail mode only
+# about the last `tail` lines are kept, so an endless producer can't grow it.
+class StreamBuffer:
+    def __init__(self, tail=None):
+        self.tail = tail
+        self.lock = threading.Lock()
+        self.chunks = []
+        self.lines = 0
+        self.closed = False
+        # Set by the Tk thread when the tab goes away, the reader stops at the next chunk
+        self.cancelled = False
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, data, final=False):
+        text = self.decoder.decode(data, final).replace("\r\n", "\n")
+        with self.lock:
+            if text:
+                self.chunks.append(text)
+                self.lines += text.count("\n")
+                self.trim()
+            if final:
+                self.closed = True
+
+    # Drops whole chunks from the front while what's left still has tail lines
+    def trim(self):
+        if self.tail == None:
+            return
+        while len(self.chunks) > 1 and self.lines - self.chunks[0].count("\n") >= self.tail:
+            self.lines -= self.chunks[0].count("\n")
+            del self.chunks[0]
+
+    def close(self):
+        self.feed(b"", final=True)
+
+    # Returns (text received since the last drain, whether the stream has ended)
+    def drain(self):
+        with self.lock:
+            text = "".join(self.chunks)
+            self.chunks = []
+            self.lines = 0
+            return (text, self.closed)
+
+    # Reads a binary file object (e.g. sys.stdin.buffer) until EOF
+    def read_from(self, stream):
+        read = getattr(stream, "read1", stream.read)
+        try:
+            while not self.cancelled:
+                data = read(CHUNK_SIZE)
+                if not data:
+                    break
+                self.feed(data)
+        except (OSError, ValueError):
+            pass
+        self.close()
+
+    def start_reader(self, stream):
+        thread = threading.Thread(target=self.read_from, args=(stream,), daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,116 @@
+import re
+
+HEADING_REGEX = re.compile("(#{1,6})\\s")
+TAB_WIDTH = 4
+
+# Files whose # lines are Markdown headings rather than comments
+HEADING_EXTENSIONS = (".md", ".markdown", ".txt")
+
+
+def uses_headings(file):
+    return file.is_unsaved or file.name.lower().endswith(HEADING_EXTENSIONS)
+
+
+# Per line: indentation (None for blank lines) and heading level (0 if not a heading)
+def parse_line(line, headings):
+    stripped = line.lstrip(" \t")
+    if stripped == "":
+        return (None, 0)
+    indent = len(line[:len(line) - len(stripped)].expandtabs(TAB_WIDTH))
+    level = 0
+    if headings:
+        match = HEADING_REGEX.match(stripped)
+        if match and indent == 0:
+            level = len(match.group(1))
+    return (indent, level)
+
+
+# The fold structure of one buffer, from indentation and Markdown headings. It keeps
+# one entry per line and is updated from edit deltas, so finding a fold never needs
+# the text of the buffer. Line numbers are 1-based like Tk's.
+#   - a heading folds everything up to the next heading of the same or a higher level
+#   - any other line folds the lines after it that are indented further than it
+class StructureIndex:
+    def __init__(self, headings):
+        self.headings = headings
+        self.lines = []
+
+    def build(self, text):
+        self.lines = [parse_line(line, self.headings) for line in text.split("\n")]
+
+    def line_count(self):
+        return len(self.lines)
+
+    # old_text and new_text are lines first.. before and after an edit
+    def update(self, first, old_text, new_text):
+        old_count = old_text.count("\n") + 1
+        parsed = [parse_line(line, self.headings) for line in new_text.split("\n")]
+        self.lines[first - 1:first - 1 + old_count] = parsed
+
+    def indent(self, line):
+        return self.lines[line - 1][0]
+
+    def level(self, line):
+        return self.lines[line - 1][1]
+
+    # (first, last) lines of the body folded under line, or None if it has no fold
+    def fold(self, line):
+        if line < 1 or line > len(self.lines):
+            return None
+        level = self.level(line)
+        if level > 0:
+            end = line
+            for n in range(line + 1, len(self.lines) + 1):
+                if 0 < self.level(n) <= level:
+                    break
+                end = n
+        else:
+            indent = self.indent(line)
+            if indent == None:
+                return None
+            end = line
+            for n in range(line + 1, len(self.lines) + 1):
+                other = self.indent(n)
+                if other == None:
+                    continue
+                if other <= indent or self.level(n) > 0:
+                    break
+                end = n
+        # Trailing blank lines stay visible
+        while end > line and self.indent(end) == None:
+            end -= 1
+        return (line + 1, end) if end > line else None
+
+    # The innermost fold that line is the header of or is inside of, as
+    # (header, first, last), or None
+    def fold_at(self, line):
+        body = self.fold(line)
+        if body != None:
+            return (line, body[0], body[1])
+        indent = self.indent(line) if 1 <= line <= len(self.lines) else None
+        for n in range(line - 1, 0, -1):
+            other = self.indent(n)
+            if other == None:
+                continue
+            if self.level(n) > 0 or indent == None or other < indent:
+                body = self.fold(n)
+                if body != None and body[0] <= line <= body[1]:
+                    return (n, body[0], body[1])
+                if self.level(n) == 1:
+                    return None
+                if indent == None or other < indent:
+                    indent = other
+        return None
+
+    # Every fold that isn't inside another one
+    def top_level_folds(self):
+        folds = []
+        line = 1
+        while line <= len(self.lines):
+            body = self.fold(line)
+            if body != None:
+                folds.append((line, body[0], body[1]))
+                line = body[1] + 1
+            else:
+                line += 1
+        return folds
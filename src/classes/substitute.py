@@ -0,0 +1,191 @@
+import re
+
+# :[range]s/pattern/replacement/[flags]
+# The range is optional and may be %, a single address or a pair of addresses
+# separated by a comma. Addresses are line numbers, . (current line) or $ (last line).
+# Patterns and replacements use Python regular expression syntax, with vim's
+# & (whole match) and \r (line break) supported in the replacement.
+SUBSTITUTE_REGEX = ":(%|[0-9.$]+(,[0-9.$]+)?)?s([^0-9A-Za-z\\s\\\\\"|]).*"
+SUBSTITUTE_FLAGS = "giIn"
+
+
+class Substitution:
+    def __init__(self, start, end, pattern, replacement, flags):
+        self.start = start
+        self.end = end
+        self.replace_all = "g" in flags
+        self.count_only = "n" in flags
+        ignore_case = "i" in flags and "I" not in flags
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}") from None
+        self.template = convert_replacement(replacement)
+        # Surfaces bad templates (e.g. \9 with no group) before any work is done
+        try:
+            self.regex.sub(self.template, "")
+        except (re.error, IndexError) as e:
+            raise ValueError(f"Invalid replacement: {e}") from None
+
+    # Returns the (first, last) line numbers the command applies to
+    def resolve_range(self, current_line, last_line):
+        if self.start == "%":
+            return (1, last_line)
+        start = resolve_address(self.start, current_line, last_line)
+        end = resolve_address(self.end, current_line, last_line)
+        if start > end:
+            start, end = end, start
+        return (max(start, 1), min(end, last_line))
+
+
+class SubstituteResult:
+    def __init__(self, edits, count, lines, last_line=None):
+        # edits: list of ((line, col), (line, col), text) in original buffer
+        # coordinates, ordered bottom to top so they can be applied in sequence
+        self.edits = edits
+        self.count = count
+        self.lines = lines
+        # Line the cursor ends up on (the last substituted line, after the edits)
+        self.last_line = last_line
+
+
+def is_substitute(command):
+    return re.fullmatch(SUBSTITUTE_REGEX, command) != None
+
+
+def resolve_address(address, current_line, last_line):
+    if address == ".":
+        return current_line
+    if address == "$":
+        return last_line
+    return int(address)
+
+
+def split_fields(text, delimiter):
+    fields = []
+    current = ""
+    escaped = False
+    for char in text:
+        if escaped:
+            # An escaped delimiter is just the delimiter, everything else keeps its backslash
+            current += char if char == delimiter else "\\" + char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == delimiter:
+            fields.append(current)
+            current = ""
+        else:
+            current += char
+    if escaped:
+        current += "\\"
+    fields.append(current)
+    return fields
+
+
+def parse_substitute(command):
+    match = re.fullmatch(SUBSTITUTE_REGEX, command)
+    if match == None:
+        raise ValueError("Not a substitute command")
+    address = match.group(1)
+    start, end = ".", "."
+    if address == "%":
+        start = end = "%"
+    elif address != None:
+        parts = address.split(",")
+        start = parts[0]
+        end = parts[1] if len(parts) == 2 else parts[0]
+    for a in (start, end):
+        if a not in ("%", ".", "$") and not a.isdigit():
+            raise ValueError(f"Invalid range: {address}")
+
+    delimiter = match.group(3)
+    body = command[match.end(3):]
+    fields = split_fields(body, delimiter)
+    if len(fields) > 3:
+        raise ValueError("Trailing characters")
+    pattern = fields[0]
+    replacement = fields[1] if len(fields) > 1 else ""
+    flags = fields[2] if len(fields) > 2 else ""
+    if pattern == "":
+        raise ValueError("Empty pattern")
+    for flag in flags:
+        if flag not in SUBSTITUTE_FLAGS:
+            raise ValueError(f"Unsupported flag: {flag}")
+    return Substitution(start, end, pattern, replacement, flags)
+
+
+# Converts a vim style replacement to a Python re template
+def convert_replacement(replacement):
+    template = ""
+    escaped = False
+    for char in replacement:
+        if escaped:
+            if char == "&":
+                template += "&"
+            elif char == "r":
+                template += "\\n"
+            else:
+                template += "\\" + char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "&":
+            template += "\\g<0>"
+        else:
+            template += char
+    if escaped:
+        template += "\\\\"
+    return template
+
+
+# Runs the substitution over a snapshot of lines [first_line, ...] of the buffer.
+# Pure function of its inputs, so it can be run away from the Tk thread.
+def compute_substitution(text, first_line, substitution):
+    old_lines = text.split("\n")
+    regex = substitution.regex
+    template = substitution.template
+    limit = 0 if substitution.replace_all else 1
+
+    changed = []
+    count = 0
+    for offset, line in enumerate(old_lines):
+        new_line, n = regex.subn(template, line, count=limit)
+        if n == 0:
+            continue
+        count += n
+        if new_line != line:
+            changed.append((offset, new_line))
+
+    lines = len(changed)
+    if substitution.count_only or lines == 0:
+        return SubstituteResult([], count, lines)
+
+    # One edit per changed line, however many there are. Tcl calls are cheap next to
+    # re-lexing, and lines in between keep their tags, marks and folds.
+    edits = [minimal_edit(old_lines[offset], new_line, first_line + offset) for offset, new_line in changed]
+    edits.reverse()
+    added_lines = sum(new_line.count("\n") for _, new_line in changed[:-1])
+    last_line = first_line + changed[-1][0] + added_lines
+    return SubstituteResult(edits, count, lines, last_line)
+
+
+# Trims the common prefix and suffix of a block so that only the differing span is
+# replaced, returning the span in (line, col) coordinates.
+def minimal_edit(old, new, first_line):
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    start = position(old, prefix, first_line)
+    end = position(old, len(old) - suffix, first_line)
+    return (start, end, new[prefix:len(new) - suffix])
+
+
+def position(text, offset, first_line):
+    line = first_line + text.count("\n", 0, offset)
+    line_start = text.rfind("\n", 0, offset) + 1
+    return (line, offset - line_start)
@@ -2,8 +2,18 @@ from typing import List
 
 NORMAL = 0 
 INSERT = 1
+VISUAL = 2
+VISUAL_LINE = 3
 INSERT_MESSAGE = "--INSERT--    |    "
 NORMAL_MESSAGE = "--NORMAL--    |    "
+VISUAL_MESSAGE = "--VISUAL--    |    "
+VISUAL_LINE_MESSAGE = "--VISUAL LINE--    |    "
+MODE_MESSAGES = {
+    NORMAL      : NORMAL_MESSAGE,
+    INSERT      : INSERT_MESSAGE,
+    VISUAL      : VISUAL_MESSAGE,
+    VISUAL_LINE : VISUAL_LINE_MESSAGE
+}
 EMPTY_BUFFER = ""
 
 class VimBuffer:
@@ -11,11 +21,18 @@ class VimBuffer:
         self.mode = NORMAL
         self.mode_message = NORMAL_MESSAGE
         self.command_buffer = EMPTY_BUFFER
+        self.message = EMPTY_BUFFER
+        # Cursor position and counts, refreshed at idle time
+        self.stats = EMPTY_BUFFER
 
 class VimController: 
     def __init__(self, label):
         self.label = label
         self.buffers : List[VimBuffer] = []
+        # Shown next to the mode while a macro is being recorded
+        self.recording = EMPTY_BUFFER
+        # While suspended (e.g. replaying a macro) the label isn't touched
+        self.suspended = False
 
     def in_normal(self, index):
         return self.buffers[index].mode == NORMAL
@@ -23,18 +40,50 @@ class VimController:
     def in_insert(self, index):
         return self.buffers[index].mode == INSERT
 
+    def in_visual(self, index):
+        return self.buffers[index].mode in (VISUAL, VISUAL_LINE)
+
+    def in_visual_line(self, index):
+        return self.buffers[index].mode == VISUAL_LINE
+
+    def in_command(self, index):
+        return self.buffers[index].command_buffer.startswith(":")
+
     def append_buffer(self, char, index):
         self.buffers[index].command_buffer += char
+        self.buffers[index].message = EMPTY_BUFFER
 
     def new_buffer(self):
         self.buffers.append(VimBuffer())
 
     def update_display(self, index):
+        if self.suspended:
+            return
         mode = self.buffers[index].mode_message
         command = self.buffers[index].command_buffer
-        text = mode + command
+        message = self.buffers[index].message
+        stats = self.buffers[index].stats
+        stats = stats + "    |    " if stats != EMPTY_BUFFER else stats
+        text = mode + self.recording + stats + (command if command != EMPTY_BUFFER else message)
         self.label.config(text=text)
 
+    def suspend_display(self):
+        self.suspended = True
+
+    def resume_display(self, index):
+        self.suspended = False
+        self.update_display(index)
+
+    def set_recording(self, register):
+        self.recording = EMPTY_BUFFER if register == None else f"recording @{register}    |    "
+
+    # Messages are shown in place of the command buffer until the next keypress
+    def set_message(self, index, message):
+        self.buffers[index].message = message
+
+    def set_stats(self, index, stats):
+        self.buffers[index].stats = stats
+
     def label_grid(self):
         self.label.grid(row=1, column=0, sticky="ew")
 
@@ -49,14 +98,21 @@ class VimController:
 
     def reset_buffers(self, index):
         mode = self.buffers[index].mode
-        self.buffers[index].mode_message = NORMAL_MESSAGE if (mode == NORMAL) else INSERT_MESSAGE
+        self.buffers[index].mode_message = MODE_MESSAGES[mode]
         self.buffers[index].command_buffer = EMPTY_BUFFER
         self.update_display(index)
 
     def switch_normal(self, index):
         self.buffers[index].mode = NORMAL
+        self.buffers[index].message = EMPTY_BUFFER
         self.reset_buffers(index)
 
     def switch_insert(self, index):
         self.buffers[index].mode = INSERT
+        self.buffers[index].message = EMPTY_BUFFER
+        self.reset_buffers(index)
+
+    def switch_visual(self, index, linewise):
+        self.buffers[index].mode = VISUAL_LINE if linewise else VISUAL
+        self.buffers[index].message = EMPTY_BUFFER
         self.reset_buffers(index)
@@ -0,0 +1,128 @@
+import re
+import heapq
+from bisect import bisect_left, insort
+
+# Words are runs of letters, digits and underscores that don't start with a digit
+WORD_REGEX = re.compile("[^\\W\\d]\\w*")
+# How many candidates a completion offers per buffer
+MAX_CANDIDATES = 50
+# One or two letters match a large part of the buffer, so for prefixes up to this
+# long the most frequent words are kept ranked and updated as counts change
+SHORT_PREFIX = 2
+# One more than is offered, the prefix itself may be among them
+TOP_SIZE = MAX_CANDIDATES + 1
+
+
+def count_words(text):
+    counts = {}
+    for word in WORD_REGEX.findall(text):
+        counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+# Word frequencies for one buffer, kept up to date from edit deltas, plus a sorted
+# list of the distinct words so that prefix lookups are a binary search
+class WordIndex:
+    def __init__(self):
+        self.counts = {}
+        self.words = []
+        # Short prefix -> its TOP_SIZE most frequent words (all of them if there
+        # are fewer), in rank order. Filled in by the first lookup.
+        self.top = {}
+
+    def build(self, text):
+        self.counts = count_words(text)
+        self.words = sorted(self.counts)
+        self.top = {}
+
+    # old_text and new_text are the lines an edit touched, before and after it
+    def update(self, old_text, new_text):
+        removed = count_words(old_text)
+        added = count_words(new_text)
+        for word, n in removed.items():
+            change = added.pop(word, 0) - n
+            if change != 0:
+                self.add(word, change)
+        for word, n in added.items():
+            self.add(word, n)
+
+    def add(self, word, change):
+        count = self.counts.get(word, 0) + change
+        if count > 0:
+            if word not in self.counts:
+                insort(self.words, word)
+            self.counts[word] = count
+        elif word in self.counts:
+            del self.counts[word]
+            del self.words[bisect_left(self.words, word)]
+        for n in range(1, min(len(word), SHORT_PREFIX) + 1):
+            self.rerank(word[:n], word, change)
+
+    # Keeps a short prefix's top words right after word's count changed
+    def rerank(self, prefix, word, change):
+        top = self.top.get(prefix)
+        if top == None:
+            return
+        if word in top:
+            if change < 0 and len(top) == TOP_SIZE:
+                # A word that isn't listed may rank higher now, look again next time
+                del self.top[prefix]
+                return
+            if word not in self.counts:
+                top.remove(word)
+        elif change > 0:
+            # Fewer than TOP_SIZE means every word with the prefix is listed
+            if len(top) == TOP_SIZE:
+                if self.rank_key(word) > self.rank_key(top[-1]):
+                    return
+                top.pop()
+            top.append(word)
+        top.sort(key=self.rank_key)
+
+    # Most frequent first, then alphabetical
+    def rank_key(self, word):
+        return (-self.counts[word], word)
+
+    # The count highest ranked words starting with prefix
+    def rank(self, prefix, count):
+        start = bisect_left(self.words, prefix)
+        # Every word with the prefix sorts before prefix + the largest code point
+        end = bisect_left(self.words, prefix + "\U0010ffff", start)
+        return heapq.nsmallest(count, self.words[start:end], key=self.rank_key)
+
+    # Most frequent words starting with prefix, excluding the prefix itself
+    def complete(self, prefix, limit=MAX_CANDIDATES):
+        if len(prefix) <= SHORT_PREFIX and limit < TOP_SIZE:
+            if prefix not in self.top:
+                self.top[prefix] = self.rank(prefix, TOP_SIZE)
+            candidates = self.top[prefix]
+        else:
+            candidates = self.rank(prefix, limit + 1)
+        return [w for w in candidates if w != prefix][:limit]
+
+
+# Cycling through candidates with ctrl + n / ctrl + p. The last entry is the
+# prefix that was typed, so cycling past the end puts it back like vim does.
+class Completion:
+    def __init__(self, codeview, start, prefix, candidates):
+        self.codeview = codeview
+        self.start = start
+        self.prefix = prefix
+        self.choices = candidates + [prefix]
+        self.position = len(self.choices) - 1
+        self.end = None
+
+    def step(self, direction):
+        self.position = (self.position + direction) % len(self.choices)
+        return self.choices[self.position]
+
+
+def merge_candidates(lists, limit=MAX_CANDIDATES):
+    merged = []
+    seen = set()
+    for candidates in lists:
+        for word in candidates:
+            if word not in seen:
+                seen.add(word)
+                merged.append(word)
+    return merged[:limit]
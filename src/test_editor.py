@@ -1,4 +1,27 @@
+import io
+import os
+import pytest
+import tempfile
+import tracemalloc
+
 from src.ac_editor import is_valid_vim
+from src.classes.batch_edit import merge_ranges
+from src.classes.substitute import is_substitute, parse_substitute, compute_substitution
+from src.classes.macro import MacroRecorder, parse_macro
+from src.classes.startup_trace import StartupTrace
+from src.classes.database import Database
+from src.classes.file import File, document_key
+from src.classes.note import fts_query
+from src.classes.word_index import WordIndex, Completion, merge_candidates
+from src.classes.instance import InstanceServer, send_paths, supported
+from src.classes.stream import StreamBuffer
+from src.classes.structure_index import StructureIndex
+from src.classes.document_stats import DocumentStats, total_stats
+from src.classes.registers import Registers, command_register, indent_lines, dedent_columns
+from src.classes import database as database_module
+from src.classes.history import make_delta, apply_delta, line_edits
+from src.classes.highlight import tokenize_blocks, lexer_spec, uses_tokens, span_indices, BLOCK_LINES
+from pygments.lexers import PythonLexer, TextLexer
 
 VALID_VIM_ANSWERS = {
     "h"   : "([1-9]+[0-9]*)*h",
@@ -11,6 +34,9 @@ VALID_VIM_ANSWERS = {
     "$"   : "\\$", 
     "gg"  : "gg", 
     "G"   : "G", 
+    "qa"  : "q[a-z]",
+    "@a"  : "([1-9]+[0-9]*)*@([a-z]|@)",
+    "za"  : "za",
 }
 
 def test_is_valid_vim_h_good():
@@ -268,3 +294,560 @@ def test_is_valid_vim_quitnosave_bad():
         valid, regex = is_valid_vim(test)
         passed &= (valid == False and regex == answer)
     assert(passed == True)
+
+def test_is_valid_vim_record_good():
+    answer = VALID_VIM_ANSWERS["qa"]
+    tests = [
+        "qa",
+        "qz",
+        "qq"
+    ]
+    passed = True
+    for test in tests:
+        valid, regex = is_valid_vim(test) 
+        passed &= (valid == True and regex == answer)
+    assert(passed == True)
+
+def test_is_valid_vim_record_bad():
+    answer = None
+    tests = [
+        "q",
+        "q1",
+        "qA",
+        "2qa"
+    ]
+    passed = True 
+    for test in tests:
+        valid, regex = is_valid_vim(test)
+        passed &= (valid == False and regex == answer)
+    assert(passed == True)
+
+def test_is_valid_vim_replay_good():
+    answer = VALID_VIM_ANSWERS["@a"]
+    tests = [
+        "@a",
+        "@@",
+        "1000@a"
+    ]
+    passed = True
+    for test in tests:
+        valid, regex = is_valid_vim(test) 
+        passed &= (valid == True and regex == answer)
+    assert(passed == True)
+
+def test_is_valid_vim_replay_bad():
+    answer = None
+    tests = [
+        "@",
+        "0@a",
+        "@1",
+        "@a1"
+    ]
+    passed = True 
+    for test in tests:
+        valid, regex = is_valid_vim(test)
+        passed &= (valid == False and regex == answer)
+    assert(passed == True)
+
+def test_is_valid_vim_fold_good():
+    tests = ["za", "zc", "zo", "zM", "zR"]
+    passed = True
+    for test in tests:
+        valid, regex = is_valid_vim(test)
+        passed &= (valid == True and regex == test)
+    assert(passed == True)
+
+def test_is_valid_vim_fold_bad():
+    tests = ["z", "zz", "2za", "Za"]
+    passed = True
+    for test in tests:
+        valid, regex = is_valid_vim(test)
+        passed &= (valid == False and regex == None)
+    assert(passed == True)
+
+def test_is_valid_vim_visual_good():
+    tests = {
+        "v"   : "v",
+        "V"   : "V",
+        "d"   : '("[a-z])?d',
+        '"ay' : '("[a-z])?y',
+        '"zp' : '("[a-z])?p',
+        ">"   : ">",
+        "<"   : "<",
+        "~"   : "~"
+    }
+    passed = True
+    for test, answer in tests.items():
+        valid, regex = is_valid_vim(test)
+        passed &= (valid == True and regex == answer)
+    assert(passed == True)
+
+def test_is_valid_vim_visual_bad():
+    tests = ['"', '"a', '"Ay', "vv", ">>", '"1p']
+    passed = True
+    for test in tests:
+        valid, regex = is_valid_vim(test)
+        passed &= (valid == False and regex == None)
+    assert(passed == True)
+
+def test_parse_macro():
+    tests = {
+        "@a"     : (1, "a"),
+        "@@"     : (1, "@"),
+        "1000@b" : (1000, "b")
+    }
+    passed = True
+    for test, answer in tests.items():
+        passed &= (parse_macro(test) == answer)
+    assert(passed == True)
+
+def test_macro_recorder():
+    macros = MacroRecorder()
+    macros.start("a")
+    keys = [("A", "A"), (";", "semicolon"), ("", "Shift_L"), ("\x1b", "Escape"), ("j", "j"), ("q", "q")]
+    for char, keysym in keys:
+        macros.record(char, keysym)
+    macros.stop()
+    recorded = [key.keysym for key in macros.get("a")]
+    assert(recorded == ["A", "semicolon", "Escape", "j"] and macros.get("@") == macros.get("a"))
+
+def test_is_substitute_good():
+    tests = [
+        ":s/a/b/",
+        ":s/a/b",
+        ":%s/a/b/g",
+        ":1,$s/a/b/gi",
+        ":.,20s#a#b#"
+    ]
+    passed = True
+    for test in tests:
+        passed &= is_substitute(test)
+    assert(passed == True)
+
+def test_is_substitute_bad():
+    tests = [
+        ":s",
+        ":sa/b/",
+        "s/a/b/",
+        ":w",
+        ":%x/a/b/"
+    ]
+    passed = True
+    for test in tests:
+        passed &= (is_substitute(test) == False)
+    assert(passed == True)
+
+def test_parse_substitute_invalid():
+    tests = [
+        ":s//b/",
+        ":s/(/b/",
+        ":s/a/b/q",
+        ":s/a/b/g/extra",
+        ":1.5s/a/b/"
+    ]
+    passed = True
+    for test in tests:
+        try:
+            parse_substitute(test)
+            passed = False
+        except ValueError:
+            pass
+    assert(passed == True)
+
+def test_substitute_range():
+    tests = {
+        ":s/a/b/"     : (4, 4),
+        ":%s/a/b/"    : (1, 10),
+        ":2,5s/a/b/"  : (2, 5),
+        ":.,$s/a/b/"  : (4, 10),
+        ":5,2s/a/b/"  : (2, 5),
+        ":3,99s/a/b/" : (3, 10)
+    }
+    passed = True
+    for test, answer in tests.items():
+        passed &= (parse_substitute(test).resolve_range(4, 10) == answer)
+    assert(passed == True)
+
+def apply_result(text, result):
+    lines = text.split("\n")
+    for (start_line, start_col), (end_line, end_col), new in result.edits:
+        before = "\n".join(lines[:start_line - 1] + [lines[start_line - 1][:start_col]])
+        after = "\n".join([lines[end_line - 1][end_col:]] + lines[end_line:])
+        lines = (before + new + after).split("\n")
+    return "\n".join(lines)
+
+def test_compute_substitution():
+    text = "foo foo\nbar\nFOO foo"
+    tests = {
+        ":%s/foo/x/"      : ("x foo\nbar\nFOO x", 2),
+        ":%s/foo/x/g"     : ("x x\nbar\nFOO x", 3),
+        ":%s/foo/x/gi"    : ("x x\nbar\nx x", 4),
+        ":%s/o+/[&]/g"    : ("f[oo] f[oo]\nbar\nFOO f[oo]", 3),
+        ":%s/(f)(o)/\\2\\1/" : ("ofo foo\nbar\nFOO ofo", 2),
+        ":%s/bar/a\\rb/"  : ("foo foo\na\nb\nFOO foo", 1)
+    }
+    passed = True
+    for test, (answer, count) in tests.items():
+        result = compute_substitution(text, 1, parse_substitute(test))
+        passed &= (apply_result(text, result) == answer and result.count == count)
+    assert(passed == True)
+
+def test_compute_substitution_scattered():
+    lines = [f"line {n}" for n in range(10000)]
+    lines[0] = lines[5000] = lines[9999] = "foo"
+    result = compute_substitution("\n".join(lines), 1, parse_substitute(":%s/foo/bar/"))
+    # One small edit per changed line, nothing in between is replaced
+    passed = (result.edits == [((10000, 0), (10000, 3), "bar"), ((5001, 0), (5001, 3), "bar"), ((1, 0), (1, 3), "bar")])
+    assert(passed == True)
+
+def test_merge_ranges():
+    ranges = [(50, 50), (10, 10), (11, 12), (2, 4), (30, 31)]
+    passed = (merge_ranges(ranges) == [(2, 4), (10, 12), (30, 31), (50, 50)])
+    passed &= (merge_ranges(ranges, 10) == [(2, 12), (30, 31), (50, 50)])
+    passed &= (merge_ranges([(n, n) for n in range(1, 200001, 2)], 20) == [(1, 199999)])
+    assert(passed == True)
+
+def test_compute_substitution_count_only():
+    result = compute_substitution("a a\na", 1, parse_substitute(":%s/a/b/gn"))
+    assert(result.count == 3 and result.lines == 2 and result.edits == [])
+
+def test_startup_trace_disabled():
+    trace = StartupTrace.from_environment(False)
+    with trace.phase("load_files"):
+        pass
+    assert(trace.phases == [] and trace.finish() == None)
+
+def test_startup_trace_phases():
+    trace = StartupTrace.from_environment(True)
+    with trace.phase("restore tabs", count=1):
+        with trace.phase("add_file New 1"):
+            data = [0] * 10000
+    tracemalloc.stop()
+    report = trace.report()
+    names = [(p["name"], p["depth"]) for p in report["phases"]]
+    events = trace.chrome_trace()["traceEvents"]
+    passed = names == [("restore tabs", 0), ("add_file New 1", 1)]
+    passed &= report["phases"][0]["args"] == {"count": 1}
+    passed &= report["phases"][0]["peak_bytes"] >= report["phases"][1]["peak_bytes"] > 0
+    passed &= all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    assert(passed == True)
+
+def test_startup_trace_time_only(monkeypatch):
+    monkeypatch.setenv("AC_EDITOR_TRACE_STARTUP", "time")
+    trace = StartupTrace.from_environment()
+    with trace.phase("load_files"):
+        data = [0] * 10000
+    passed = (trace.active() and not trace.memory and not tracemalloc.is_tracing())
+    passed &= (trace.report()["phases"][0]["peak_bytes"] == 0)
+    passed &= ("times only" in trace.summary())
+    assert(passed == True)
+
+def test_document_key():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "a.md")
+    open(path, "w").close()
+    link = os.path.join(directory, "link.md")
+    os.symlink(path, link)
+    passed = (document_key(link) == document_key(path))
+    passed &= (document_key(os.path.join(directory, "sub", "..", "a.md")) == document_key(path))
+    passed &= (document_key(os.path.join(directory, "b.md")) != document_key(path))
+    assert(passed == True)
+
+def test_fts_query():
+    tests = {
+        "meeting"       : '"meeting"*',
+        "tk  widget"    : '"tk" "widget"*',
+        'say "hi" OR'   : '"say" """hi""" "OR"*',
+        "   "           : None
+    }
+    passed = True
+    for test, answer in tests.items():
+        passed &= (fts_query(test) == answer)
+    assert(passed == True)
+
+def test_notes_index_and_search():
+    database = Database(":memory:")
+    note = File(path=None, name="New 1", rank=1, content=None, is_unsaved=True)
+    saved = File(path="/tmp/todo.md", name="todo.md", rank=2, content=None, is_unsaved=False)
+    passed = database.index_note(note, "groceries and a meeting with the team")
+    passed &= database.index_note(saved, "nothing much")
+    # Unchanged content isn't re-indexed
+    passed &= (database.index_note(note, "groceries and a meeting with the team") == False)
+    passed &= database.index_note(saved, "prepare the meeting agenda")
+    results = database.search_notes("meet")
+    passed &= (sorted(r.title for r in results) == ["New 1", "todo.md"])
+    passed &= (database.search_notes("nothing") == [])
+    passed &= ("[meeting]" in database.search_notes("agenda meeting")[0].snippet)
+    assert(passed == True)
+
+def test_notes_archive():
+    database = Database(":memory:")
+    note = File(path=None, name="New 1", rank=1, content=None, is_unsaved=True)
+    database.index_note(note, "first note")
+    database.archive_note(note)
+    database.index_note(note, "second note")
+    results = database.search_notes("note")
+    keys = [r.key for r in results]
+    passed = (len(results) == 2 and "unsaved:New 1" in keys)
+    archived = [r for r in results if r.key != "unsaved:New 1"][0]
+    passed &= (database.note_content(archived.key) == "first note")
+    database.remove_note(archived.key)
+    passed &= (len(database.search_notes("note")) == 1)
+    assert(passed == True)
+
+def test_notes_reopen():
+    database = Database(":memory:")
+    note = File(path=None, name="New 1", rank=1, content=None, is_unsaved=True)
+    database.index_note(note, "first note")
+    database.archive_note(note)
+    archived = database.search_notes("note")[0]
+    reopened = File(path=None, name="New 2", rank=2, content=None, is_unsaved=True)
+    database.reopen_note(archived.key, reopened)
+    results = database.search_notes("note")
+    passed = ([(r.key, r.title) for r in results] == [("unsaved:New 2", "New 2")])
+    passed &= (database.note_content("unsaved:New 2") == "first note")
+    passed &= (database.note_content(archived.key) == "")
+    assert(passed == True)
+
+def test_history_delta():
+    tests = [
+        ("a\nb\nc", "a\nB\nc"),
+        ("a\nb\nc", "a\nb\nc\nd"),
+        ("a\nb\nc", "b"),
+        ("", "x\n"),
+        ("x\n", "")
+    ]
+    passed = True
+    for old, new in tests:
+        passed &= (apply_delta(old, make_delta(old, new)) == new)
+    passed &= (line_edits("a\nb\nc", "a\nB\nc") == [((2, 0), (2, 1), "B")])
+    passed &= (line_edits("a\nb", "a\nb\nc") == [((2, 1), (2, 1), "\nc")])
+    passed &= (line_edits("a\nb\nc", "a\nc") == [((2, 0), (3, 0), "")])
+    assert(passed == True)
+
+# Every other line of a large file changed, compared line against line this took
+# minutes
+def test_history_delta_scattered():
+    old = "\n".join(f"line {n}" for n in range(40000))
+    new = "\n".join(f"line {n}" if n % 2 else f"changed {n}" for n in range(40000))
+    passed = (apply_delta(old, make_delta(old, new)) == new)
+    edits = line_edits(old, new)
+    passed &= (len(edits) == 20000)
+    passed &= (edits[0] == ((39999, 0), (39999, 10), "changed 39998"))
+    # Repeated lines alone don't anchor anything, but the result is still right
+    old = "}\n\n" * 5000 + "x"
+    new = "\n}" * 5000 + "y"
+    passed &= (apply_delta(old, make_delta(old, new)) == new)
+    assert(passed == True)
+
+def test_history_versions(monkeypatch):
+    monkeypatch.setattr(database_module, "SNAPSHOT_INTERVAL", 3)
+    database = Database(":memory:")
+    contents = [f"line {n}\n" * 50 + f"version {n}" for n in range(10)]
+    passed = True
+    for content in contents:
+        passed &= database.record_version("/tmp/a.md", content)
+    # Saving without changes doesn't add a version
+    passed &= (database.record_version("/tmp/a.md", contents[-1]) == False)
+    passed &= ([v.number for v in database.history("/tmp/a.md")] == list(range(10, 0, -1)))
+    database.history_cache.clear()
+    for n in range(10):
+        passed &= (database.version_content("/tmp/a.md", n + 1) == contents[n])
+    passed &= (database.version_content("/tmp/a.md", 11) == None)
+    assert(passed == True)
+
+def test_history_retention(monkeypatch):
+    monkeypatch.setattr(database_module, "MAX_VERSIONS", 4)
+    database = Database(":memory:")
+    for n in range(10):
+        database.record_version("/tmp/a.md", f"version {n}")
+    versions = database.history("/tmp/a.md")
+    passed = ([v.number for v in versions] == [10, 9, 8, 7])
+    database.history_cache.clear()
+    passed &= (database.version_content("/tmp/a.md", 7) == "version 6")
+    assert(passed == True)
+
+def test_tokenize_blocks():
+    blocks = tokenize_blocks('\nimport os\ns = """a\nb"""\n', lexer_spec(PythonLexer()))
+    passed = (len(blocks) == 1 and blocks[0][0] == 1)
+    spans = blocks[0][2]
+    passed &= (span_indices(spans["Token.Keyword.Namespace"]) == ["2.0", "2.6"])
+    # A string spanning lines ends where it really ends
+    passed &= (span_indices(spans["Token.Literal.String.Double"])[-1] == "4.4")
+    passed &= (uses_tokens(PythonLexer()) and not uses_tokens(TextLexer()))
+    assert(passed == True)
+
+def test_tokenize_blocks_cover_every_line():
+    text = "x = 1\n" * (BLOCK_LINES * 2) + "\n" * BLOCK_LINES + "y = 2"
+    blocks = tokenize_blocks(text, lexer_spec(PythonLexer()))
+    passed = (blocks[0][0] == 1)
+    for before, after in zip(blocks, blocks[1:]):
+        passed &= (after[0] == before[1] + 1)
+    last = BLOCK_LINES * 3 + 1
+    passed &= (blocks[-1][1] >= last)
+    passed &= (span_indices(blocks[-1][2]["Token.Name"]) == [f"{last}.0", f"{last}.1"])
+    assert(passed == True)
+
+def test_word_index_complete():
+    words = WordIndex()
+    words.build("print printer printer 2print _private\nprinted print")
+    tests = {
+        "pri"   : ["print", "printer", "printed"],
+        "print" : ["printer", "printed"],
+        "_p"    : ["_private"],
+        "x"     : []
+    }
+    passed = True
+    for test, answer in tests.items():
+        passed &= (words.complete(test) == answer)
+    assert(passed == True)
+
+# The most frequent words for a short prefix, even when thousands of rarer ones
+# sort before them
+def test_word_index_complete_short_prefix():
+    words = WordIndex()
+    words.build(" ".join(f"aa{n}" for n in range(5000)) + " and" * 20 + " an" * 10)
+    passed = (words.complete("a")[:2] == ["and", "an"])
+    passed &= (words.complete("an") == ["and"])
+    words.update("", " ".join(["an"] * 30))
+    passed &= (words.complete("a")[:2] == ["an", "and"])
+    words.update(" ".join(["and"] * 20), "")
+    passed &= (words.complete("a")[0] == "an" and "and" not in words.complete("a"))
+    passed &= (words.complete("a")[1:3] == ["aa0", "aa1"])
+    assert(passed == True)
+
+def test_word_index_update():
+    words = WordIndex()
+    words.build("alpha beta\ngamma")
+    words.update("alpha beta", "alpha betamax")
+    words.update("gamma", "")
+    words.update("", "delta delta")
+    passed = (words.counts == {"alpha": 1, "betamax": 1, "delta": 2})
+    passed &= (words.words == ["alpha", "betamax", "delta"])
+    assert(passed == True)
+
+def test_completion_cycle():
+    completion = Completion(None, "1.0", "pr", ["print", "printer"])
+    tests = [(1, "print"), (1, "printer"), (1, "pr"), (-1, "printer")]
+    passed = True
+    for direction, answer in tests:
+        passed &= (completion.step(direction) == answer)
+    passed &= (merge_candidates([["a", "b"], ["b", "c"]]) == ["a", "b", "c"])
+    assert(passed == True)
+
+@pytest.mark.skipif(not supported(), reason="needs AF_UNIX sockets")
+def test_instance_hand_off():
+    socket_path = os.path.join(tempfile.mkdtemp(), "ac_editor.sock")
+    passed = (send_paths(["/tmp/a.md"], socket_path) == False)
+    server = InstanceServer(socket_path)
+    passed &= server.start()
+    # A second editor can't take over the socket
+    passed &= (InstanceServer(socket_path).start() == False)
+    passed &= send_paths(["/tmp/a.md", "/tmp/b.md"], socket_path)
+    passed &= send_paths([], socket_path)
+    server.close()
+    passed &= (server.requests.qsize() == 2)
+    passed &= ([r.paths for r in server.pending()] == [["/tmp/a.md", "/tmp/b.md"], []])
+    passed &= (send_paths(["/tmp/a.md"], socket_path) == False)
+    assert(passed == True)
+
+def test_stream_buffer():
+    stream = StreamBuffer()
+    data = "caf\u00e9\r\nline two\n".encode("utf-8")
+    # Split in the middle of the two byte character
+    stream.feed(data[:4])
+    stream.feed(data[4:])
+    passed = (stream.drain() == ("caf\u00e9\nline two\n", False))
+    stream.close()
+    passed &= (stream.drain() == ("", True))
+    assert(passed == True)
+
+def test_stream_buffer_tail():
+    stream = StreamBuffer(tail=3)
+    for n in range(100):
+        stream.feed(f"line {n}\n".encode("utf-8"))
+    text, closed = stream.drain()
+    assert(text == "line 97\nline 98\nline 99\n" and closed == False)
+
+@pytest.mark.skipif(not supported(), reason="needs AF_UNIX sockets")
+def test_instance_stream():
+    socket_path = os.path.join(tempfile.mkdtemp(), "ac_editor.sock")
+    server = InstanceServer(socket_path)
+    server.start()
+    passed = send_paths([], socket_path, stream=io.BytesIO(b"one\ntwo\n"))
+    stream = server.pending()[0].stream
+    passed &= (stream.drain() == ("one\ntwo\n", True))
+    server.close()
+    assert(passed == True)
+
+def test_structure_index_indent():
+    structure = StructureIndex(headings=False)
+    structure.build("def f():\n    if x:\n        y\n\n    z\n\n# comment\nw")
+    tests = {
+        1 : (1, 2, 5),
+        2 : (2, 3, 3),
+        3 : (2, 3, 3),
+        4 : (1, 2, 5),
+        5 : (1, 2, 5),
+        6 : None,
+        7 : None
+    }
+    passed = True
+    for line, answer in tests.items():
+        passed &= (structure.fold_at(line) == answer)
+    passed &= (structure.top_level_folds() == [(1, 2, 5)])
+    assert(passed == True)
+
+def test_structure_index_headings():
+    structure = StructureIndex(headings=True)
+    structure.build("# A\ntext\n## B\n  more\n# C\nlast")
+    passed = (structure.fold(1) == (2, 4))
+    passed &= (structure.fold(3) == (4, 4))
+    passed &= (structure.fold_at(4) == (3, 4, 4))
+    passed &= (structure.top_level_folds() == [(1, 2, 4), (5, 6, 6)])
+    assert(passed == True)
+
+def test_structure_index_update():
+    structure = StructureIndex(headings=False)
+    structure.build("a\nb\nc")
+    # Indent b and c under a, then split c into two lines
+    structure.update(2, "b\nc", "  b\n  c")
+    structure.update(3, "  c", "  c\n  d")
+    passed = (structure.line_count() == 4)
+    passed &= (structure.fold(1) == (2, 4))
+    structure.update(1, "a\n  b", "")
+    passed &= (structure.line_count() == 3)
+    passed &= (structure.fold(1) == None)
+    assert(passed == True)
+
+def test_document_stats_update():
+    stats = DocumentStats()
+    stats.build("one two\nthree")
+    passed = ((stats.lines, stats.words, stats.chars) == (2, 3, 13))
+    # Joining the two lines, then adding a line below
+    stats.update(1, "one two\nthree", "one twothree")
+    passed &= ((stats.lines, stats.words, stats.chars) == (1, 2, 12))
+    stats.update(1, "one twothree", "one twothree\n  four five  ")
+    passed &= ((stats.lines, stats.words, stats.chars) == (2, 4, 26))
+    fresh = DocumentStats()
+    fresh.build("one twothree\n  four five  ")
+    passed &= ((fresh.lines, fresh.words, fresh.chars) == (stats.lines, stats.words, stats.chars))
+    total = total_stats([stats, fresh])
+    passed &= (total.describe() == "4 lines  8 words  52 chars")
+    assert(passed == True)
+
+def test_registers():
+    registers = Registers()
+    passed = (registers.get(None) == None)
+    registers.set("a", "first", False)
+    registers.set(None, "line\n", True)
+    passed &= (registers.get("a").text == "first")
+    passed &= (registers.get(None).text == "line\n" and registers.get(None).linewise)
+    passed &= (command_register('"ay') == "a" and command_register("y") == None)
+    assert(passed == True)
+
+def test_indent_lines():
+    lines = ["a", "", "\tb", "      c", "  d"]
+    passed = (indent_lines(10, lines) == [10, 12, 13, 14])
+    passed &= (dedent_columns(10, lines, 4) == [(12, 1), (13, 4), (14, 2)])
+    assert(passed == True)